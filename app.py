@@ -1,8 +1,33 @@
 import streamlit as st  
-import requests  
 import pandas as pd  
-from rapidfuzz import fuzz, process  
-import io  
+import os
+from datetime import datetime
+from functools import partial
+
+from hh_city_matcher.cache import MatchCache
+from hh_city_matcher.candidates import MAX_CANDIDATE_BYTES, CandidateStore
+from hh_city_matcher.corrections import CorrectionStore
+from hh_city_matcher.districts import FEDERAL_DISTRICTS, DistrictMap
+from hh_city_matcher.engine import CONFIRMED_NO_MATCH, REVIEW_MAX_SCORE
+from hh_city_matcher.export import (
+    EXPORT_FORMATS, frame_digest, publisher_frame, selections_digest, to_bytes
+)
+from hh_city_matcher.ingest import estimate_row_count
+from hh_city_matcher.jobs import (
+    CANCELLED, DONE, FAILED, INTERRUPTED, QUEUED, RUNNING, JobManager
+)
+from hh_city_matcher.index import get_matcher_index
+from hh_city_matcher.matching import get_candidates_by_word
+from hh_city_matcher.progress import describe_progress
+from hh_city_matcher.regions import CityDirectory
+from hh_city_matcher.results import NO_MATCH, apply_manual_selections, build_results_view, search_results
+from hh_city_matcher.snapshot import AreasProvider
+
+# Сколько строк показывать на странице ручной проверки
+REVIEW_PAGE_SIZES = (25, 50, 100)
+
+# Как часто обновлять прогресс фонового сопоставления (в секундах)
+JOB_POLL_INTERVAL = 1.0
 
 # Настройка страницы  
 st.set_page_config(  
@@ -46,6 +71,8 @@ st.markdown("""
 # Инициализация session_state  
 if 'result_df' not in st.session_state:  
     st.session_state.result_df = None  
+if 'results_view' not in st.session_state:  
+    st.session_state.results_view = None  
 if 'duplicate_count' not in st.session_state:  
     st.session_state.duplicate_count = 0  
 if 'processed' not in st.session_state:  
@@ -53,553 +80,132 @@ if 'processed' not in st.session_state:
 if 'manual_selections' not in st.session_state:  
     st.session_state.manual_selections = {}  
 if 'candidates_cache' not in st.session_state:  
-    st.session_state.candidates_cache = {}  
+    st.session_state.candidates_cache = CandidateStore()  
 if 'search_query' not in st.session_state:  
     st.session_state.search_query = ""  
 
-# ============================================  
-# СПРАВОЧНИК ФЕДЕРАЛЬНЫХ ОКРУГОВ И РЕГИОНОВ  
-# ============================================  
-FEDERAL_DISTRICTS = {
-    "Центральный федеральный округ": [
-        "Белгородская область", "Брянская область", "Владимирская область",
-        "Воронежская область", "Ивановская область", "Калужская область",
-        "Костромская область", "Курская область", "Липецкая область",
-        "Московская область", "Орловская область", "Рязанская область",
-        "Смоленская область", "Тамбовская область", "Тверская область",
-        "Тульская область", "Ярославская область", "Москва"
-    ],
-    "Южный федеральный округ": [
-        "Республика Адыгея", "Республика Калмыкия", "Краснодарский край",
-        "Астраханская область", "Волгоградская область", "Ростовская область"
-    ],
-    "Северо-Западный федеральный округ": [
-        "Республика Карелия", "Республика Коми", "Архангельская область",
-        "Вологодская область", "Калининградская область", "Ленинградская область",
-        "Мурманская область", "Новгородская область", "Псковская область",
-        "Санкт-Петербург", "Ненецкий автономный округ"
-    ],
-    "Дальневосточный федеральный округ": [
-        "Республика Саха (Якутия)", "Камчатский край", "Приморский край",
-        "Хабаровский край", "Амурская область", "Магаданская область",
-        "Сахалинская область", "Еврейская автономная область", "Чукотский автономный округ"
-    ],
-    "Сибирский федеральный округ": [
-        "Республика Алтай", "Республика Бурятия", "Республика Тыва",
-        "Республика Хакасия", "Алтайский край", "Забайкальский край",
-        "Красноярский край", "Иркутская область", "Кемеровская область",
-        "Новосибирская область", "Омская область", "Томская область"
-    ],
-    "Уральский федеральный округ": [
-        "Курганская область", "Свердловская область", "Тюменская область",
-        "Челябинская область", "Ханты-Мансийский автономный округ — Югра",
-        "Ямало-Ненецкий автономный округ"
-    ],
-    "Приволжский федеральный округ": [
-        "Республика Башкортостан", "Республика Марий Эл", "Республика Мордовия",
-        "Республика Татарстан", "Удмуртская Республика", "Чувашская Республика",
-        "Кировская область", "Нижегородская область", "Оренбургская область",
-        "Пензенская область", "Пермский край", "Самарская область",
-        "Саратовская область", "Ульяновская область"
-    ],
-    "Северо-Кавказский федеральный округ": [
-        "Республика Дагестан", "Республика Ингушетия", "Кабардино-Балкарская Республика",
-        "Карачаево-Черкесская Республика", "Республика Северная Осетия — Алания",
-        "Чеченская Республика", "Ставропольский край"
-    ],
-    "Крымский федеральный округ": [
-        "Республика Крым", "Севастополь"
-    ]
-}
-
 # ============================================  
 # ФУНКЦИИ  
 # ============================================  
-@st.cache_data(ttl=3600)  
-def get_hh_areas():  
-    """Получает справочник HH.ru"""  
-    response = requests.get('https://api.hh.ru/areas')  
-    data = response.json()  
-      
-    areas_dict = {}  
-      
-    def parse_areas(areas, parent_name="", parent_id="", root_parent_id=""):  
-        for area in areas:  
-            area_id = area['id']  
-            area_name = area['name']  
-            
-            # Определяем корневой parent_id (страну)
-            current_root_id = root_parent_id if root_parent_id else parent_id if parent_id else area_id
-              
-            areas_dict[area_name] = {  
-                'id': area_id,  
-                'name': area_name,  
-                'parent': parent_name,
-                'parent_id': parent_id,
-                'root_parent_id': current_root_id  # ID страны верхнего уровня
-            }  
-              
-            if area.get('areas'):  
-                parse_areas(area['areas'], area_name, area_id, current_root_id)  
-      
-    parse_areas(data)  
-    return areas_dict  
+@st.cache_resource
+def get_areas_provider():
+    """Источник справочника HH.ru: локальный снимок с фоновой сверкой через API"""
+    return AreasProvider()
 
-def get_cities_by_regions(hh_areas, selected_regions):
-    """Получает все города из выбранных регионов (только Россия, только города)"""
-    cities = []
-    
-    # Список исключений - что не выгружать (нормализованные названия в нижнем регистре)
-    excluded_names_normalized = [
-        'россия', 'другие регионы', 'другие страны',
-        'чукотский ао', 'ямало-ненецкий ао', 'ненецкий ао', 
-        'ханты-мансийский ао - югра', 'еврейская ао',
-        'беловское', 'горькая балка'
-    ]
-    
-    # Ключевые слова, которые указывают на регион, а не город
-    region_keywords = ['область', 'край', 'республика', 'округ', 'автономн']
-    
-    # ID России
-    russia_id = '113'
-    
-    for city_name, city_info in hh_areas.items():
-        parent = city_info['parent']
-        root_parent_id = city_info.get('root_parent_id', '')
-        
-        # Пропускаем всё, что не относится к России
-        if root_parent_id != russia_id:
-            continue
-        
-        # Нормализуем название для проверки исключений
-        city_name_normalized = city_name.lower().strip()
-        
-        # Пропускаем исключенные названия (нормализованное сравнение)
-        if city_name_normalized in excluded_names_normalized:
-            continue
-        
-        # Пропускаем области, края, республики
-        if not parent or parent == 'Россия':
-            # Проверяем, не является ли это областью/краем/республикой по названию
-            is_region = any(keyword in city_name_normalized for keyword in region_keywords)
-            if is_region:
-                continue
-            
-            # Дополнительная проверка: если название заканчивается на "АО" и это не город
-            if city_name.endswith(' АО') or city_name.endswith('АО'):
-                continue
-        
-        # Проверяем, входит ли город в выбранные регионы
-        for region in selected_regions:
-            # Нормализуем названия для сравнения
-            region_normalized = region.lower().strip()
-            parent_normalized = parent.lower().strip() if parent else ""
-            
-            # Проверяем различные варианты совпадений
-            if (region_normalized in parent_normalized or 
-                parent_normalized in region_normalized or
-                region_normalized == parent_normalized or
-                region_normalized == city_name_normalized):
-                cities.append({
-                    'Город': city_name,
-                    'ID HH': city_info['id'],
-                    'Регион': parent if parent else 'Россия'
-                })
-                break
-    
-    # Создаем DataFrame
-    df = pd.DataFrame(cities)
-    
-    # Удаляем дубликаты по названию города (без учета регистра и пробелов), оставляем первое вхождение
-    if not df.empty:
-        # Создаем временную колонку для сравнения: нижний регистр + удаление лишних пробелов
-        df['_город_normalized'] = df['Город'].str.lower().str.strip().str.replace(r'\s+', ' ', regex=True)
-        # Удаляем дубликаты
-        df = df.drop_duplicates(subset=['_город_normalized'], keep='first')
-        # Удаляем временную колонку
-        df = df.drop(columns=['_город_normalized'])
-    
-    return df
+@st.cache_resource
+def get_match_cache():
+    """Постоянный кэш сопоставлений, общий для всех сессий"""
+    return MatchCache()
 
-def get_all_cities(hh_areas):
-    """Получает все города из справочника HH (только Россия, только города)"""
-    cities = []
-    
-    # Список исключений - что не выгружать (нормализованные названия в нижнем регистре)
-    excluded_names_normalized = [
-        'россия', 'другие регионы', 'другие страны',
-        'чукотский ао', 'ямало-ненецкий ао', 'ненецкий ао', 
-        'ханты-мансийский ао - югра', 'еврейская ао',
-        'беловское', 'горькая балка'
-    ]
-    
-    # Ключевые слова, которые указывают на регион, а не город
-    region_keywords = ['область', 'край', 'республика', 'округ', 'автономн']
-    
-    # ID России
-    russia_id = '113'
-    
-    for city_name, city_info in hh_areas.items():
-        parent = city_info['parent']
-        root_parent_id = city_info.get('root_parent_id', '')
-        
-        # Пропускаем всё, что не относится к России
-        if root_parent_id != russia_id:
-            continue
-        
-        # Нормализуем название для проверки исключений
-        city_name_normalized = city_name.lower().strip()
-        
-        # Пропускаем исключенные названия (нормализованное сравнение)
-        if city_name_normalized in excluded_names_normalized:
-            continue
-        
-        # Пропускаем области, края, республики
-        if not parent or parent == 'Россия':
-            # Проверяем, не является ли это областью/краем/республикой по названию
-            is_region = any(keyword in city_name_normalized for keyword in region_keywords)
-            if is_region:
-                continue
-            
-            # Дополнительная проверка: если название заканчивается на "АО" и это не город
-            if city_name.endswith(' АО') or city_name.endswith('АО'):
-                continue
-        
-        cities.append({
-            'Город': city_name,
-            'ID HH': city_info['id'],
-            'Регион': parent if parent else 'Россия'
-        })
+@st.cache_resource
+def get_correction_store():
+    """Сохранённые ручные исправления, общие для всех сессий"""
+    return CorrectionStore()
+
+def correction_label(area_id):
+    """Подпись ответа из хранилища исправлений"""
+    if area_id is None:
+        return NO_MATCH
+    if area_id in area_store:
+        return area_store.label(area_id)
+    return f"id {area_id} (нет в справочнике)"
+
+def save_corrections(corrections, force=False):
+    """Записывает исправления; конфликты остаются в session_state до перезаписи или сброса"""
+    save_result = get_correction_store().save(
+        corrections,
+        base_revision=st.session_state.corrections_revision,
+        force=force,
+        source=st.session_state.source_name
+    )
+    st.session_state.correction_conflicts = save_result.conflicts
+    if save_result.saved:
+        st.session_state.corrections_revision = get_correction_store().revision
+    return save_result
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_export(content_key, fmt, sheet_name, header, _table):
+    """Файл для скачивания: строится по клику и кэшируется по хэшу содержимого"""
+    return to_bytes(_table, fmt, sheet_name, header)
+
+def row_candidates(row):
+    """Кандидаты строки редактора: из хранилища сессии или, если не сохранены, посчитанные заново"""
+    candidates = st.session_state.candidates_cache.get(row['row_id'])
+    if candidates is not None:
+        return candidates
+    # Повторам исходного названия и пустым значениям кандидаты не положены и при сопоставлении
+    if row['Статус'] in ('🔄 Дубликат (исходное название)', '❌ Пустое значение'):
+        return []
+    return get_candidates_by_word(row['Исходное название'], matcher_index.candidate_index)
+
+@st.cache_resource
+def get_job_manager():
+    """Очередь фоновых сопоставлений, общая для всех сессий"""
+    return JobManager()
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_job_progress(job):
+    """Прогресс фонового задания; опрашивается без перезапуска всей страницы"""
+    if job.status not in (QUEUED, RUNNING):
+        # Задание завершилось — перезапускаем страницу целиком, чтобы показать результаты
+        st.rerun()
     
-    # Создаем DataFrame
-    df = pd.DataFrame(cities)
+    if job.status == QUEUED or job.progress is None:
+        st.info("⏳ Задание в очереди...")
+    else:
+        if job.progress.fraction is not None:
+            st.progress(job.progress.fraction)
+        st.text(describe_progress(job.progress) + "...")
     
-    # Удаляем дубликаты по названию города (без учета регистра и пробелов), оставляем первое вхождение
-    if not df.empty:
-        # Создаем временную колонку для сравнения: нижний регистр + удаление лишних пробелов
-        df['_город_normalized'] = df['Город'].str.lower().str.strip().str.replace(r'\s+', ' ', regex=True)
-        # Удаляем дубликаты
-        df = df.drop_duplicates(subset=['_город_normalized'], keep='first')
-        # Удаляем временную колонку
-        df = df.drop(columns=['_город_normalized'])
+    # Промежуточные итоги по уже обработанным порциям
+    if job.status_counts:
+        st.caption(" | ".join(f"{status}: {count}" for status, count in job.status_counts.most_common()))
     
-    return df
+    if st.button("⏹ Остановить", key="cancel_job"):
+        job.cancel()
 
-def normalize_region_name(text):  
-    """Нормализует название региона для сравнения"""  
-    text = text.lower()  
-    replacements = {  
-        'ленинградская': 'ленинград',  
-        'московская': 'москов',  
-        'курская': 'курск',  
-        'кемеровская': 'кемеров',  
-        'свердловская': 'свердлов',  
-        'нижегородская': 'нижегород',  
-        'новосибирская': 'новосибирск',  
-        'тамбовская': 'тамбов',  
-        'красноярская': 'красноярск',  
-        'область': '',  
-        'обл': '',  
-        'край': '',  
-        'республика': '',  
-        'респ': '',  
-        '  ': ' '  
-    }  
-    for old, new in replacements.items():  
-        text = text.replace(old, new)  
-    return text.strip()  
+def load_job_results(job):
+    """Переносит результаты завершённого задания в session_state"""
+    job_results = job.load_results()
+    # Кандидаты хранятся в плоских массивах; что не влезло в предел, досчитывается при показе
+    st.session_state.candidates_cache = CandidateStore(job_results['candidates'], MAX_CANDIDATE_BYTES)
+    st.session_state.result_df = pd.DataFrame(job_results['results'])
+    # Порядок показа и поисковая колонка считаются один раз, а не на каждый перезапуск
+    st.session_state.results_view = build_results_view(st.session_state.result_df)
+    st.session_state.result_digest = frame_digest(st.session_state.result_df)
+    st.session_state.dup_original = job_results['dup_original']
+    st.session_state.dup_hh = job_results['dup_hh']
+    st.session_state.total_dup = job_results['dup_original'] + job_results['dup_hh']
+    st.session_state.match_stats = job_results['stats']
+    st.session_state.processed = True
+    st.session_state.manual_selections = {}
+    # Ревизия исправлений, с которой шло сопоставление: более поздние чужие правки — конфликты
+    st.session_state.corrections_revision = job.meta.get('corrections_revision') or 0
+    st.session_state.correction_conflicts = []
+    st.session_state.search_query = ""
+    st.session_state.review_page = 1
+    st.session_state.loaded_job_id = job.job_id
+    st.session_state.source_name = job.filename
 
-def extract_city_and_region(text):  
-    """Извлекает название города и региона из текста"""  
-    text_lower = text.lower()  
-      
-    region_keywords = [  
-        'област', 'край', 'республик', 'округ',  
-        'ленинград', 'москов', 'курск', 'кемеров',  
-        'свердлов', 'нижегород', 'новосибирск', 'тамбов',  
-        'красноярск'  
-    ]  
-      
-    words = text.split()  
-      
-    if len(words) == 1:  
-        return text, None  
-      
-    city_words = []  
-    region_words = []  
-    region_found = False  
-      
-    for word in words:  
-        word_lower = word.lower()  
-        if not region_found and any(keyword in word_lower for keyword in region_keywords):  
-            region_found = True  
-            region_words.append(word)  
-        elif region_found:  
-            region_words.append(word)  
-        else:  
-            city_words.append(word)  
-      
-    city = ' '.join(city_words) if city_words else text  
-    region = ' '.join(region_words) if region_words else None  
-      
-    return city, region  
+@st.cache_resource(max_entries=2)
+def get_city_directory(snapshot_version, _area_store):
+    """Города России по регионам (строится один раз на версию снимка)"""
+    return CityDirectory(_area_store)
 
-def check_if_changed(original, matched):  
-    """Проверяет, изменилось ли название города"""  
-    if matched is None or matched == "❌ Нет совпадения":  
-        return False  
-      
-    original_clean = original.strip()  
-    matched_clean = matched.strip()  
-      
-    return original_clean != matched_clean  
+@st.cache_resource(max_entries=2)
+def get_district_map(snapshot_version, _area_store):
+    """Федеральные округа, привязанные к id регионов справочника"""
+    return DistrictMap(_area_store)
 
-def get_candidates_by_word(client_city, hh_city_names, limit=20):  
-    """Получает кандидатов по совпадению начального слова"""  
-    first_word = client_city.split()[0].lower().strip()  
-      
-    candidates = []  
-    for city_name in hh_city_names:  
-        city_lower = city_name.lower()  
-        if first_word in city_lower:  
-            score = fuzz.WRatio(client_city.lower(), city_lower)  
-            candidates.append((city_name, score))  
-      
-    candidates.sort(key=lambda x: x[1], reverse=True)  
-      
-    return candidates[:limit]  
-
-def smart_match_city(client_city, hh_city_names, hh_areas, threshold=85):  
-    """Умное сопоставление города с сохранением кандидатов"""  
-      
-    city_part, region_part = extract_city_and_region(client_city)  
-    city_part_lower = city_part.lower().strip()  
-      
-    word_candidates = get_candidates_by_word(client_city, hh_city_names)  
-      
-    if word_candidates and len(word_candidates) > 0 and word_candidates[0][1] >= threshold:  
-        best_candidate = word_candidates[0]  
-        return (best_candidate[0], best_candidate[1], 0), word_candidates  
-      
-    if not word_candidates or (word_candidates and word_candidates[0][1] < threshold):  
-        return None, word_candidates  
-      
-    exact_matches = []  
-    exact_matches_with_region = []  
-      
-    for hh_city_name in hh_city_names:  
-        hh_city_base = hh_city_name.split('(')[0].strip().lower()  
-          
-        if city_part_lower == hh_city_base:  
-            if region_part:  
-                region_normalized = normalize_region_name(region_part)  
-                hh_normalized = normalize_region_name(hh_city_name)  
-                  
-                if region_normalized in hh_normalized:  
-                    exact_matches_with_region.append(hh_city_name)  
-                else:  
-                    exact_matches.append(hh_city_name)  
-            else:  
-                exact_matches.append(hh_city_name)  
-      
-    if exact_matches_with_region:  
-        best_match = exact_matches_with_region[0]  
-        score = fuzz.WRatio(client_city.lower(), best_match.lower())  
-        return (best_match, score, 0), word_candidates  
-    elif exact_matches:  
-        best_match = exact_matches[0]  
-        score = fuzz.WRatio(client_city.lower(), best_match.lower())  
-        return (best_match, score, 0), word_candidates  
-      
-    candidates = process.extract(  
-        client_city,  
-        hh_city_names,  
-        scorer=fuzz.WRatio,  
-        limit=10  
-    )  
-      
-    if not candidates:  
-        return None, word_candidates  
-      
-    candidates = [c for c in candidates if c[1] >= threshold]  
-      
-    if not candidates:  
-        return None, word_candidates  
-      
-    if len(candidates) == 1:  
-        return candidates[0], word_candidates  
-      
-    best_match = None  
-    best_score = 0  
-      
-    client_city_lower = client_city.lower()  
-      
-    for candidate_name, score, _ in candidates:  
-        candidate_lower = candidate_name.lower()  
-        adjusted_score = score  
-          
-        candidate_city = candidate_name.split('(')[0].strip().lower()  
-          
-        if city_part_lower == candidate_city:  
-            adjusted_score += 50  
-        elif city_part_lower in candidate_city:  
-            adjusted_score += 30  
-        elif candidate_city in city_part_lower:  
-            adjusted_score += 20  
-        else:  
-            adjusted_score -= 30  
-          
-        if region_part:  
-            region_normalized = normalize_region_name(region_part)  
-            candidate_normalized = normalize_region_name(candidate_name)  
-              
-            if region_normalized in candidate_normalized:  
-                adjusted_score += 40  
-            elif '(' in candidate_name:  
-                adjusted_score -= 25  
-          
-        len_diff = abs(len(candidate_city) - len(city_part_lower))  
-        if len_diff > 3:  
-            adjusted_score -= 20  
-          
-        if len(candidate_city) > len(city_part_lower) + 4:  
-            adjusted_score -= 25  
-          
-        if len(candidate_name) > 15 and len(client_city) > 15:  
-            adjusted_score += 5  
-          
-        region_keywords = ['област', 'край', 'республик', 'округ']  
-        client_has_region = any(keyword in client_city_lower for keyword in region_keywords)  
-        candidate_has_region = any(keyword in candidate_lower for keyword in region_keywords)  
-          
-        if client_has_region and candidate_has_region:  
-            adjusted_score += 15  
-        elif client_has_region and not candidate_has_region:  
-            adjusted_score -= 15  
-          
-        if adjusted_score > best_score:  
-            best_score = adjusted_score  
-            best_match = (candidate_name, score, _)  
-      
-    return (best_match if best_match else candidates[0]), word_candidates  
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_cities_by_regions(snapshot_version, region_ids, _city_directory):
+    """Получает все города из выбранных регионов (только Россия, только города)"""
+    return _city_directory.cities_in_regions(region_ids)
 
-def match_cities(client_cities, hh_areas, threshold=85):  
-    """Сопоставляет города с сохранением кандидатов"""  
-    results = []  
-    hh_city_names = list(hh_areas.keys())  
-      
-    seen_original_cities = {}  
-    seen_hh_cities = {}  
-      
-    duplicate_original_count = 0  
-    duplicate_hh_count = 0  
-      
-    st.session_state.candidates_cache = {}  
-      
-    progress_bar = st.progress(0)  
-    status_text = st.empty()  
-      
-    for idx, client_city in enumerate(client_cities):  
-        progress = (idx + 1) / len(client_cities)  
-        progress_bar.progress(progress)  
-        status_text.text(f"Обработано {idx + 1} из {len(client_cities)} городов...")  
-          
-        if pd.isna(client_city) or str(client_city).strip() == "":  
-            results.append({  
-                'Исходное название': client_city,  
-                'Итоговое гео': None,  
-                'ID HH': None,  
-                'Регион': None,  
-                'Совпадение %': 0,  
-                'Изменение': 'Нет',  
-                'Статус': '❌ Пустое значение',  
-                'row_id': idx  
-            })  
-            continue  
-          
-        client_city_original = str(client_city).strip()  
-        client_city_normalized = client_city_original.lower().strip()  
-          
-        if client_city_normalized in seen_original_cities:  
-            duplicate_original_count += 1  
-            original_result = seen_original_cities[client_city_normalized]  
-            results.append({  
-                'Исходное название': client_city_original,  
-                'Итоговое гео': original_result['Итоговое гео'],  
-                'ID HH': original_result['ID HH'],  
-                'Регион': original_result['Регион'],  
-                'Совпадение %': original_result['Совпадение %'],  
-                'Изменение': original_result['Изменение'],  
-                'Статус': '🔄 Дубликат (исходное название)',  
-                'row_id': idx  
-            })  
-            continue  
-          
-        match_result, candidates = smart_match_city(client_city_original, hh_city_names, hh_areas, threshold)  
-          
-        st.session_state.candidates_cache[idx] = candidates  
-          
-        if match_result:  
-            matched_name = match_result[0]  
-            score = match_result[1]  
-            hh_info = hh_areas[matched_name]  
-            hh_city_normalized = hh_info['name'].lower().strip()  
-              
-            is_changed = check_if_changed(client_city_original, hh_info['name'])  
-            change_status = 'Да' if is_changed else 'Нет'  
-              
-            if hh_city_normalized in seen_hh_cities:  
-                duplicate_hh_count += 1  
-                city_result = {  
-                    'Исходное название': client_city_original,  
-                    'Итоговое гео': hh_info['name'],  
-                    'ID HH': hh_info['id'],  
-                    'Регион': hh_info['parent'],  
-                    'Совпадение %': round(score, 1),  
-                    'Изменение': change_status,  
-                    'Статус': '🔄 Дубликат (результат HH)',  
-                    'row_id': idx  
-                }  
-                results.append(city_result)  
-                seen_original_cities[client_city_normalized] = city_result  
-            else:  
-                status = '✅ Точное' if score >= 95 else '⚠️ Похожее'  
-                  
-                city_result = {  
-                    'Исходное название': client_city_original,  
-                    'Итоговое гео': hh_info['name'],  
-                    'ID HH': hh_info['id'],  
-                    'Регион': hh_info['parent'],  
-                    'Совпадение %': round(score, 1),  
-                    'Изменение': change_status,  
-                    'Статус': status,  
-                    'row_id': idx  
-                }  
-                  
-                results.append(city_result)  
-                seen_original_cities[client_city_normalized] = city_result  
-                seen_hh_cities[hh_city_normalized] = True  
-        else:  
-            city_result = {  
-                'Исходное название': client_city_original,  
-                'Итоговое гео': None,  
-                'ID HH': None,  
-                'Регион': None,  
-                'Совпадение %': 0,  
-                'Изменение': 'Нет',  
-                'Статус': '❌ Не найдено',  
-                'row_id': idx  
-            }  
-              
-            results.append(city_result)  
-            seen_original_cities[client_city_normalized] = city_result  
-      
-    progress_bar.empty()  
-    status_text.empty()  
-      
-    total_duplicates = duplicate_original_count + duplicate_hh_count  
-      
-    return pd.DataFrame(results), duplicate_original_count, duplicate_hh_count, total_duplicates  
+@st.cache_data(max_entries=2, show_spinner=False)
+def get_all_cities(snapshot_version, _city_directory):
+    """Получает все города из справочника HH (только Россия, только города)"""
+    return _city_directory.all_cities()
 
 # ============================================  
 # ИНТЕРФЕЙС  
@@ -615,11 +221,17 @@ st.markdown(
 st.markdown("---")  
 
 # Загрузка справочника HH
+areas_provider = get_areas_provider()
 try:  
-    hh_areas = get_hh_areas()  
+    areas_snapshot = areas_provider.get()
+    # Справочник и индексы строятся один раз на версию снимка и разделяются всеми сессиями
+    matcher_index = get_matcher_index(areas_snapshot.areas, areas_snapshot.version)
+    area_store = matcher_index.area_store
 except Exception as e:  
     st.error(f"❌ Ошибка загрузки справочника: {str(e)}")  
-    hh_areas = None  
+    areas_snapshot = None
+    matcher_index = None
+    area_store = None  
 
 # ============================================
 # БЛОК: СИНХРОНИЗАТОР ГОРОДОВ
@@ -635,6 +247,27 @@ with st.sidebar:
         value=85,  
         help="Минимальный процент совпадения"  
     )  
+    
+    parallel_matching = st.checkbox(
+        "⚡ Параллельное сопоставление",
+        value=False,
+        help="Распределяет расчёт по нескольким процессам. Полезно для файлов на десятки тысяч строк"
+    )
+    match_processes = None
+    if parallel_matching:
+        match_processes = st.number_input(
+            "Число процессов",
+            min_value=2,
+            max_value=max(os.cpu_count() or 2, 2),
+            value=max(os.cpu_count() or 2, 2),
+            step=1
+        )
+    
+    collect_stats = st.checkbox(
+        "🛠 Статистика этапов",
+        value=False,
+        help="Считает попадания и время по этапам сопоставления и самые медленные строки — для поиска узких мест"
+    )
       
     st.markdown("---")  
       
@@ -662,6 +295,7 @@ with st.sidebar:
     - ⚠️ **Похожее** - совпадение ≥порога  
     - 🔄 **Дубликат** - повторы  
     - ❌ **Не найдено** - совпадение <порога  
+    - ❌ **Не найдено (исправление)** - «нет совпадения» подтверждено раньше  
     """)  
 
 col1, col2 = st.columns([1, 1])  
@@ -682,34 +316,71 @@ with col1:
 
 with col2:  
     st.subheader("ℹ️ Информация")  
-    if hh_areas:
-        st.success(f"✅ Справочник HH загружен: **{len(hh_areas)}** городов")  
+    if area_store:
+        st.success(f"✅ Справочник HH загружен: **{len(area_store)}** городов")  
+        snapshot_date = datetime.fromtimestamp(areas_snapshot.fetched_at).strftime('%d.%m.%Y %H:%M')
+        st.caption(f"Снимок справочника от {snapshot_date}, версия {areas_snapshot.version}")
+        if areas_provider.last_error is not None:
+            st.warning("⚠️ API HH.ru недоступно — используется сохранённый снимок справочника")
 
-if uploaded_file is not None and hh_areas is not None:  
+# Текущее задание: из сессии или из адресной строки, чтобы пережить перезагрузку вкладки
+job_manager = get_job_manager()
+current_job_id = st.session_state.get('job_id') or st.query_params.get('job')
+current_job = job_manager.get(current_job_id) if current_job_id else None
+
+if (uploaded_file is not None or current_job is not None) and area_store is not None:  
     st.markdown("---")  
       
     try:  
-        if uploaded_file.name.endswith('.csv'):  
-            df = pd.read_csv(uploaded_file, header=None)  
-        else:  
-            df = pd.read_excel(uploaded_file, header=None)  
-          
-        client_cities = df.iloc[:, 0].tolist()  
-        st.info(f"📄 Загружено **{len(client_cities)}** городов из файла")  
+        if uploaded_file is not None:  
+            # Файл не читается целиком: число строк оцениваем один раз на загрузку
+            if st.session_state.get('upload_file_id') != uploaded_file.file_id:  
+                st.session_state.upload_file_id = uploaded_file.file_id  
+                st.session_state.upload_row_estimate = estimate_row_count(uploaded_file, uploaded_file.name)  
+            row_estimate = st.session_state.upload_row_estimate  
+              
+            if row_estimate:  
+                st.info(f"📄 В файле около **{row_estimate}** строк")  
+              
+            if st.button("🚀 Начать сопоставление", type="primary", use_container_width=True):  
+                # Сопоставление идёт в фоне; тот же файл с теми же настройками продолжает прежнее задание
+                current_job = job_manager.submit(  
+                    uploaded_file.getvalue(),  
+                    uploaded_file.name,  
+                    area_store,  
+                    threshold,  
+                    match_processes,  
+                    get_match_cache(),  
+                    row_estimate,  
+                    candidate_index=matcher_index.candidate_index,  
+                    collect_stats=collect_stats,  
+                    corrections=get_correction_store()  
+                )  
+                st.session_state.job_id = current_job.job_id  
+                st.query_params['job'] = current_job.job_id  
+                st.session_state.loaded_job_id = None  
+                st.session_state.processed = False  
           
-        if st.button("🚀 Начать сопоставление", type="primary", use_container_width=True):  
-            with st.spinner("Обрабатываю..."):  
-                result_df, dup_original, dup_hh, total_dup = match_cities(client_cities, hh_areas, threshold)  
-                st.session_state.result_df = result_df  
-                st.session_state.dup_original = dup_original  
-                st.session_state.dup_hh = dup_hh  
-                st.session_state.total_dup = total_dup  
-                st.session_state.processed = True  
-                st.session_state.manual_selections = {}  
-                st.session_state.search_query = ""  
+        if current_job is not None and st.session_state.get('loaded_job_id') != current_job.job_id:  
+            if current_job.status == INTERRUPTED:  
+                # Задание прервано перезапуском сервера — продолжаем с последней сохранённой порции
+                if not job_manager.resume(
+                    current_job, area_store, get_match_cache(), candidate_index=matcher_index.candidate_index,
+                    corrections=get_correction_store()
+                ):  
+                    st.warning("⚠️ Справочник или таблица сокращений обновились после запуска — начните сопоставление заново")  
+              
+            if current_job.status == DONE:  
+                load_job_results(current_job)  
+            elif current_job.status == FAILED:  
+                st.error(f"❌ Ошибка сопоставления: {current_job.error}")  
+            elif current_job.status == CANCELLED:  
+                st.info("⏹ Сопоставление остановлено — запустите его снова, чтобы продолжить")  
+            elif current_job.status in (QUEUED, RUNNING):  
+                show_job_progress(current_job)  
           
         if st.session_state.processed and st.session_state.result_df is not None:  
-            result_df = st.session_state.result_df.copy()  
+            result_df = st.session_state.result_df  
             dup_original = st.session_state.dup_original  
             dup_hh = st.session_state.dup_hh  
             total_dup = st.session_state.total_dup  
@@ -723,7 +394,7 @@ if uploaded_file is not None and hh_areas is not None:
             exact = len(result_df[result_df['Статус'] == '✅ Точное'])  
             similar = len(result_df[result_df['Статус'] == '⚠️ Похожее'])  
             duplicates = len(result_df[result_df['Статус'].str.contains('Дубликат', na=False)])  
-            not_found = len(result_df[result_df['Статус'] == '❌ Не найдено'])  
+            not_found = len(result_df[result_df['Статус'].str.startswith('❌ Не найдено', na=False)])  
               
             to_export = len(result_df[  
                 (~result_df['Статус'].str.contains('Дубликат', na=False)) &   
@@ -754,28 +425,10 @@ if uploaded_file is not None and hh_areas is not None:
                 label_visibility="visible"  
             )  
               
-            result_df['sort_priority'] = result_df.apply(  
-                lambda row: 0 if row['Совпадение %'] == 0 else (1 if row['Изменение'] == 'Да' else 2),  
-                axis=1  
-            )  
-              
-            result_df_sorted = result_df.sort_values(  
-                by=['sort_priority', 'Совпадение %'],  
-                ascending=[True, True]  
-            ).reset_index(drop=True)  
+            result_df_sorted = st.session_state.results_view  
               
             if st.session_state.search_query and st.session_state.search_query.strip():  
-                search_lower = st.session_state.search_query.lower().strip()  
-                mask = result_df_sorted.apply(  
-                    lambda row: (  
-                        search_lower in str(row['Исходное название']).lower() or  
-                        search_lower in str(row['Итоговое гео']).lower() or  
-                        search_lower in str(row['Регион']).lower() or  
-                        search_lower in str(row['Статус']).lower()  
-                    ),  
-                    axis=1  
-                )  
-                result_df_filtered = result_df_sorted[mask]  
+                result_df_filtered = search_results(result_df_sorted, st.session_state.search_query)  
                   
                 if len(result_df_filtered) == 0:  
                     st.warning(f"По запросу **'{st.session_state.search_query}'** ничего не найдено")  
@@ -784,19 +437,52 @@ if uploaded_file is not None and hh_areas is not None:
             else:  
                 result_df_filtered = result_df_sorted  
               
-            display_df = result_df_filtered.copy()  
-            display_df = display_df.drop(['row_id', 'sort_priority'], axis=1, errors='ignore')  
+            display_df = result_df_filtered.drop(['row_id', 'sort_priority', '_search'], axis=1, errors='ignore')  
               
             st.dataframe(display_df, use_container_width=True, height=400)  
               
-            editable_rows = result_df_sorted[result_df_sorted['Совпадение %'] <= 90].copy()  
+            editable_rows = result_df_sorted[result_df_sorted['Совпадение %'] <= REVIEW_MAX_SCORE]  
+            # Подтверждённое раньше «нет совпадения» по умолчанию не проверяется повторно
+            confirmed_rows = editable_rows['Статус'] == CONFIRMED_NO_MATCH  
+            if confirmed_rows.any() and not st.checkbox(  
+                f"Показать в редакторе запомненные «Нет совпадения» ({confirmed_rows.sum()})",  
+                key="show_confirmed_no_match"  
+            ):  
+                editable_rows = editable_rows[~confirmed_rows]  
               
             if len(editable_rows) > 0:  
                 st.markdown("---")  
                 st.subheader("✏️ Редактирование городов с совпадением ≤ 90%")  
                 st.info(f"Найдено **{len(editable_rows)}** городов, доступных для редактирования")  
+                candidate_store = st.session_state.candidates_cache
+                memory_note = f"Кандидаты в памяти сессии: {len(candidate_store)} строк, {candidate_store.nbytes / 1024 / 1024:.1f} МБ"
+                if candidate_store.dropped_rows:
+                    memory_note += f"; для {candidate_store.dropped_rows} строк сверх предела кандидаты считаются при показе страницы"
+                st.caption(memory_note)
+                  
+                # Рисуется только текущая страница: виджеты на каждую строку делают перезапуск долгим
+                page_col1, page_col2, _ = st.columns([1, 1, 4])  
+                with page_col1:  
+                    page_size = st.selectbox(  
+                        "Строк на странице",  
+                        options=REVIEW_PAGE_SIZES,  
+                        key="review_page_size"  
+                    )  
+                page_count = (len(editable_rows) + page_size - 1) // page_size  
+                if st.session_state.get("review_page", 1) > page_count:  
+                    st.session_state.review_page = page_count  
+                with page_col2:  
+                    page = st.number_input(  
+                        f"Страница (из {page_count})",  
+                        min_value=1,  
+                        max_value=page_count,  
+                        step=1,  
+                        key="review_page"  
+                    )  
+                  
+                page_rows = editable_rows.iloc[(page - 1) * page_size:page * page_size]  
                   
-                for idx, row in editable_rows.iterrows():  
+                for idx, row in page_rows.iterrows():  
                     with st.container():  
                         col1, col2, col3, col4 = st.columns([2, 3, 1, 1])  
                           
@@ -805,54 +491,56 @@ if uploaded_file is not None and hh_areas is not None:
                           
                         with col2:  
                             row_id = row['row_id']  
-                            candidates = st.session_state.candidates_cache.get(row_id, [])  
+                            candidates = row_candidates(row)  
                               
-                            if candidates:  
-                                options = ["❌ Нет совпадения"] + [f"{c[0]} ({c[1]:.1f}%)" for c in candidates]  
-                                  
-                                current_value = row['Итоговое гео']  
+                            # Автоматический результат всегда среди вариантов и выбран по умолчанию,
+                            # даже если его нет в списке кандидатов
+                            current_value = row['ID HH']  
+                            auto_id = int(current_value) if pd.notna(current_value) and current_value else None  
+                            scores = dict(candidates)  
+                            candidate_ids = [c[0] for c in candidates]  
+                            if auto_id is not None and auto_id not in scores:  
+                                scores[auto_id] = row['Совпадение %']  
+                                candidate_ids.insert(0, auto_id)  
+                              
+                            if candidate_ids:  
+                                # Варианты — id регионов HH, подпись строится из справочника
+                                options = [NO_MATCH] + candidate_ids  
+                                auto_idx = options.index(auto_id) if auto_id is not None else 0  
                                   
+                                default_idx = auto_idx  
                                 if row_id in st.session_state.manual_selections:  
                                     selected_value = st.session_state.manual_selections[row_id]  
-                                    if selected_value == "❌ Нет совпадения":  
-                                        default_idx = 0  
-                                    else:  
-                                        default_idx = 0  
-                                        for i, c in enumerate(candidates):  
-                                            if c[0] == selected_value:  
-                                                default_idx = i + 1  
-                                                break  
-                                else:  
-                                    default_idx = 0  
-                                    if current_value:  
-                                        for i, c in enumerate(candidates):  
-                                            if c[0] == current_value:  
-                                                default_idx = i + 1  
-                                                break  
+                                    if selected_value in options:  
+                                        default_idx = options.index(selected_value)  
                                   
                                 selected = st.selectbox(  
                                     "Выберите город:",  
                                     options=options,  
                                     index=default_idx,  
+                                    format_func=lambda option, scores=scores: (  
+                                        option if option == NO_MATCH  
+                                        else f"{area_store.label(option)} ({scores[option]:.1f}%)"  
+                                    ),  
                                     key=f"select_{row_id}",  
                                     label_visibility="collapsed"  
                                 )  
                                   
-                                if selected == "❌ Нет совпадения":  
-                                    st.session_state.manual_selections[row_id] = "❌ Нет совпадения"  
+                                # Храним только правки пользователя — они переживают смену страницы;
+                                # «Нет совпадения» при автоматическом результате — тоже правка
+                                if selected != options[auto_idx]:  
+                                    st.session_state.manual_selections[row_id] = selected  
                                 else:  
-                                    selected_city = selected.rsplit(' (', 1)[0]  
-                                    st.session_state.manual_selections[row_id] = selected_city  
+                                    st.session_state.manual_selections.pop(row_id, None)  
                             else:  
                                 st.selectbox(  
                                     "Нет кандидатов",  
-                                    options=["❌ Нет совпадения"],  
+                                    options=[NO_MATCH],  
                                     index=0,  
                                     key=f"select_{row_id}",  
                                     label_visibility="collapsed",  
                                     disabled=True  
                                 )  
-                                st.session_state.manual_selections[row_id] = "❌ Нет совпадения"  
                           
                         with col3:  
                             st.text(f"{row['Совпадение %']}%")  
@@ -867,54 +555,81 @@ if uploaded_file is not None and hh_areas is not None:
                     changed_count = len(st.session_state.manual_selections) - no_match_count  
                       
                     st.success(f"✅ Внесено изменений: {changed_count} | ❌ Отмечено как 'Нет совпадения': {no_match_count}")  
+                      
+                    # Запомненные правки подставляются при следующих загрузках сразу, без поиска
+                    if st.button("🧠 Запомнить исправления", help="Те же названия в следующих файлах сопоставятся так же"):  
+                        originals = result_df.set_index('row_id')['Исходное название']  
+                        corrections = {  
+                            originals[row_id]: None if value == NO_MATCH else value  
+                            for row_id, value in st.session_state.manual_selections.items()  
+                        }  
+                        save_result = save_corrections(corrections)  
+                        st.success(f"🧠 Запомнено: {save_result.saved} | без изменений: {save_result.unchanged}")  
+                  
+                conflicts = st.session_state.get('correction_conflicts')  
+                if conflicts:  
+                    st.warning(f"⚠️ Не записано исправлений, которые другие изменили после загрузки результатов: {len(conflicts)}")  
+                    st.dataframe(  
+                        pd.DataFrame(  
+                            [  
+                                (conflict.input, correction_label(conflict.saved_area_id), correction_label(conflict.new_area_id))  
+                                for conflict in conflicts  
+                            ],  
+                            columns=['Исходное название', 'Сохранено', 'Ваш вариант']  
+                        ),  
+                        use_container_width=True,  
+                        hide_index=True  
+                    )  
+                    conflict_col1, conflict_col2, _ = st.columns([1, 1, 2])  
+                    with conflict_col1:  
+                        if st.button("Перезаписать своими", key="corrections_force"):  
+                            save_result = save_corrections(  
+                                {conflict.input: conflict.new_area_id for conflict in conflicts}, force=True  
+                            )  
+                            st.success(f"🧠 Перезаписано: {save_result.saved}")  
+                    with conflict_col2:  
+                        if st.button("Оставить сохранённые", key="corrections_keep"):  
+                            st.session_state.correction_conflicts = []  
+                            st.rerun()  
               
             st.markdown("---")  
             st.subheader("💾 Скачать результаты")  
               
-            col1, col2, col3 = st.columns(3)  
+            final_result_df = apply_manual_selections(result_df, st.session_state.manual_selections, area_store)  
               
-            final_result_df = result_df.copy()  
-            if st.session_state.manual_selections:  
-                for row_id, new_value in st.session_state.manual_selections.items():  
-                    mask = final_result_df['row_id'] == row_id  
-                      
-                    if new_value == "❌ Нет совпадения":  
-                        final_result_df.loc[mask, 'Итоговое гео'] = None  
-                        final_result_df.loc[mask, 'ID HH'] = None  
-                        final_result_df.loc[mask, 'Регион'] = None  
-                        final_result_df.loc[mask, 'Совпадение %'] = 0  
-                        final_result_df.loc[mask, 'Изменение'] = 'Нет'  
-                        final_result_df.loc[mask, 'Статус'] = '❌ Не найдено'  
-                    else:  
-                        final_result_df.loc[mask, 'Итоговое гео'] = new_value  
-                          
-                        if new_value in hh_areas:  
-                            final_result_df.loc[mask, 'ID HH'] = hh_areas[new_value]['id']  
-                            final_result_df.loc[mask, 'Регион'] = hh_areas[new_value]['parent']  
-                          
-                        original = final_result_df.loc[mask, 'Исходное название'].values[0]  
-                        final_result_df.loc[mask, 'Изменение'] = 'Да' if check_if_changed(original, new_value) else 'Нет'  
+            # Файлы строятся только по клику и кэшируются: итоговая таблица однозначно
+            # задаётся результатами сопоставления, ручными правками и версией справочника
+            export_format = st.radio(  
+                "Формат файлов",  
+                options=list(EXPORT_FORMATS),  
+                format_func=lambda fmt: EXPORT_FORMATS[fmt][0],  
+                horizontal=True,  
+                key='export_format'  
+            )  
+            _, extension, mime = EXPORT_FORMATS[export_format]  
+            export_key = "|".join([  
+                st.session_state.result_digest,  
+                selections_digest(st.session_state.manual_selections),  
+                str(area_store.version)  
+            ])  
+            base_name = st.session_state.source_name.rsplit('.', 1)[0]  
+            publisher_df = publisher_frame(final_result_df)  
+            publisher_data = partial(build_export, export_key, export_format, 'Гео', False, publisher_df)  
+              
+            col1, col2, col3 = st.columns(3)  
               
             with col1:  
                 if st.session_state.manual_selections:  
-                    unique_manual_df = final_result_df[~final_result_df['Статус'].str.contains('Дубликат', na=False)]  
-                    publisher_manual_df = pd.DataFrame({'Итоговое гео': unique_manual_df['Итоговое гео']})  
-                    publisher_manual_df = publisher_manual_df.dropna()  
-                      
-                    output_manual = io.BytesIO()  
-                    with pd.ExcelWriter(output_manual, engine='openpyxl') as writer:  
-                        publisher_manual_df.to_excel(writer, index=False, header=False, sheet_name='Гео')  
-                    output_manual.seek(0)  
-                      
-                    manual_count = len(publisher_manual_df)  
+                    manual_count = len(publisher_df)  
                     total_cities = len(result_df)  
                     percentage = (manual_count / total_cities * 100) if total_cities > 0 else 0  
                       
                     st.download_button(  
                         label=f"✏️ С ручными изменениями\n{manual_count} ({percentage:.0f}%) из {total_cities}",  
-                        data=output_manual,  
-                        file_name=f"geo_manual_{uploaded_file.name.rsplit('.', 1)[0]}.xlsx",  
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  
+                        data=publisher_data,  
+                        file_name=f"geo_manual_{base_name}.{extension}",  
+                        mime=mime,  
+                        on_click="ignore",  
                         use_container_width=True,  
                         type="primary",  
                         key='download_manual'  
@@ -928,41 +643,63 @@ if uploaded_file is not None and hh_areas is not None:
                     )  
               
             with col2:  
-                output = io.BytesIO()  
                 export_df = final_result_df.drop(['row_id', 'sort_priority'], axis=1, errors='ignore')  
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:  
-                    export_df.to_excel(writer, index=False, sheet_name='Результат')  
-                output.seek(0)  
                   
                 st.download_button(  
                     label="📥 Скачать полный отчет",  
-                    data=output,  
-                    file_name=f"result_{uploaded_file.name.rsplit('.', 1)[0]}.xlsx",  
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  
+                    data=partial(build_export, export_key, export_format, 'Результат', True, export_df),  
+                    file_name=f"result_{base_name}.{extension}",  
+                    mime=mime,  
+                    on_click="ignore",  
                     use_container_width=True,  
                     key='download_full'  
                 )  
               
             with col3:  
-                unique_df = final_result_df[~final_result_df['Статус'].str.contains('Дубликат', na=False)]  
-                publisher_df = pd.DataFrame({'Итоговое гео': unique_df['Итоговое гео']})  
-                publisher_df = publisher_df.dropna()  
-                  
-                output_publisher = io.BytesIO()  
-                with pd.ExcelWriter(output_publisher, engine='openpyxl') as writer:  
-                    publisher_df.to_excel(writer, index=False, header=False, sheet_name='Гео')  
-                output_publisher.seek(0)  
-                  
                 unique_count = len(publisher_df)  
                   
                 st.download_button(  
                     label=f"📤 Файл для публикатора ({unique_count})",  
-                    data=output_publisher,  
-                    file_name=f"geo_for_publisher_{uploaded_file.name.rsplit('.', 1)[0]}.xlsx",  
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  
+                    data=publisher_data,  
+                    file_name=f"geo_for_publisher_{base_name}.{extension}",  
+                    mime=mime,  
+                    on_click="ignore",  
                     use_container_width=True,  
                     key='download_publisher'  
                 )  
+              
+            match_stats = st.session_state.get('match_stats')  
+            if match_stats is not None:  
+                with st.expander("🛠 Статистика этапов сопоставления"):  
+                    stage_df = pd.DataFrame(  
+                        [  
+                            (label, hits, round(seconds, 3), None if per_hit is None else round(per_hit, 3))  
+                            for _, label, hits, seconds, per_hit in match_stats.stage_rows()  
+                        ],  
+                        columns=['Этап', 'Попаданий', 'Время, с', 'мс на попадание']  
+                    )  
+                    st.dataframe(stage_df, use_container_width=True, hide_index=True)  
+                      
+                    slow_queries = match_stats.slow_queries()  
+                    if slow_queries:  
+                        st.markdown(f"**Самые медленные строки** (из {match_stats.rows} замеренных)")  
+                        st.dataframe(  
+                            pd.DataFrame(  
+                                [(text, stage, round(seconds * 1000, 2)) for seconds, text, stage in slow_queries],  
+                                columns=['Строка', 'Этап', 'Время, мс']  
+                            ),  
+                            use_container_width=True,  
+                            hide_index=True  
+                        )  
+                      
+                    st.download_button(  
+                        label="📥 Скачать статистику (JSON)",  
+                        data=match_stats.to_json(),  
+                        file_name=f"match_stats_{base_name}.json",  
+                        mime="application/json",  
+                        on_click="ignore",  
+                        key='download_stats'  
+                    )  
       
     except Exception as e:  
         st.error(f"❌ Ошибка обработки файла: {str(e)}")  
@@ -977,7 +714,15 @@ st.markdown("---")
 st.header("🗺️ Выбор регионов")
 st.markdown("Выберите федеральные округа и области для получения списка всех городов")
 
-if hh_areas is not None:
+if area_store is not None:
+    city_directory = get_city_directory(area_store.version, area_store)
+    district_map = get_district_map(area_store.version, area_store)
+    
+    # Названия из списка округов, которых нет в справочнике (и наоборот), показываем, а не теряем молча
+    if not district_map.is_complete:
+        with st.expander("⚠️ Список округов расходится со справочником HH"):
+            st.markdown("\n".join(f"- {line}" for line in district_map.report()))
+    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -1019,6 +764,9 @@ if hh_areas is not None:
         for district in selected_districts:
             regions_to_search.extend(FEDERAL_DISTRICTS[district])
     
+    # Принадлежность городов проверяется по id регионов, а не по сходству названий
+    region_ids = district_map.ids_for_regions(regions_to_search)
+    
     # Кнопки действий
     col_btn1, col_btn2 = st.columns(2)
     
@@ -1033,7 +781,9 @@ if hh_areas is not None:
             
             if st.button("🔍 Получить список городов по регионам", type="primary", use_container_width=True):
                 with st.spinner("Формирую список городов..."):
-                    cities_df = get_cities_by_regions(hh_areas, regions_to_search)
+                    # Порядок выбора на результат не влияет — ключ кэша не зависит от него
+                    regions_key = tuple(sorted(set(region_ids)))
+                    cities_df = get_cities_by_regions(area_store.version, regions_key, city_directory)
                     
                     if not cities_df.empty:
                         st.success(f"✅ Найдено **{len(cities_df)}** городов в выбранных регионах")
@@ -1046,16 +796,13 @@ if hh_areas is not None:
                         
                         with col1:
                             # Полный отчет
-                            output_full = io.BytesIO()
-                            with pd.ExcelWriter(output_full, engine='openpyxl') as writer:
-                                cities_df.to_excel(writer, index=False, sheet_name='Города')
-                            output_full.seek(0)
-                            
+                            regions_export_key = f"regions|{area_store.version}|{','.join(map(str, regions_key))}"
                             st.download_button(
                                 label=f"📥 Скачать полный отчет ({len(cities_df)} городов)",
-                                data=output_full,
+                                data=partial(build_export, regions_export_key, 'xlsx', 'Города', True, cities_df),
                                 file_name="cities_full_report.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                mime=EXPORT_FORMATS['xlsx'][2],
+                                on_click="ignore",
                                 use_container_width=True,
                                 key="download_regions_full"
                             )
@@ -1063,16 +810,13 @@ if hh_areas is not None:
                         with col2:
                             # Только названия городов для публикатора
                             publisher_df = pd.DataFrame({'Город': cities_df['Город']})
-                            output_publisher = io.BytesIO()
-                            with pd.ExcelWriter(output_publisher, engine='openpyxl') as writer:
-                                publisher_df.to_excel(writer, index=False, header=False, sheet_name='Гео')
-                            output_publisher.seek(0)
                             
                             st.download_button(
                                 label=f"📤 Для публикатора ({len(cities_df)} городов)",
-                                data=output_publisher,
+                                data=partial(build_export, regions_export_key, 'xlsx', 'Гео', False, publisher_df),
                                 file_name="cities_for_publisher.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                mime=EXPORT_FORMATS['xlsx'][2],
+                                on_click="ignore",
                                 use_container_width=True,
                                 key="download_regions_publisher"
                             )
@@ -1085,7 +829,7 @@ if hh_areas is not None:
         # Кнопка для выгрузки всех городов
         if st.button("🌍 Выгрузить ВСЕ города из справочника", type="secondary", use_container_width=True):
             with st.spinner("Формирую полный список городов..."):
-                all_cities_df = get_all_cities(hh_areas)
+                all_cities_df = get_all_cities(area_store.version, city_directory)
                 
                 if not all_cities_df.empty:
                     st.success(f"✅ Найдено **{len(all_cities_df)}** городов в справочнике HH.ru")
@@ -1098,16 +842,13 @@ if hh_areas is not None:
                     
                     with col1:
                         # Полный отчет
-                        output_all_full = io.BytesIO()
-                        with pd.ExcelWriter(output_all_full, engine='openpyxl') as writer:
-                            all_cities_df.to_excel(writer, index=False, sheet_name='Города')
-                        output_all_full.seek(0)
-                        
+                        all_export_key = f"all_cities|{area_store.version}"
                         st.download_button(
                             label=f"📥 Скачать полный отчет ({len(all_cities_df)} городов)",
-                            data=output_all_full,
+                            data=partial(build_export, all_export_key, 'xlsx', 'Города', True, all_cities_df),
                             file_name="all_cities_full_report.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            mime=EXPORT_FORMATS['xlsx'][2],
+                            on_click="ignore",
                             use_container_width=True,
                             key="download_all_full"
                         )
@@ -1115,16 +856,13 @@ if hh_areas is not None:
                     with col2:
                         # Только названия городов для публикатора
                         publisher_all_df = pd.DataFrame({'Город': all_cities_df['Город']})
-                        output_all_publisher = io.BytesIO()
-                        with pd.ExcelWriter(output_all_publisher, engine='openpyxl') as writer:
-                            publisher_all_df.to_excel(writer, index=False, header=False, sheet_name='Гео')
-                        output_all_publisher.seek(0)
                         
                         st.download_button(
                             label=f"📤 Для публикатора ({len(all_cities_df)} городов)",
-                            data=output_all_publisher,
+                            data=partial(build_export, all_export_key, 'xlsx', 'Гео', False, publisher_all_df),
                             file_name="all_cities_for_publisher.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            mime=EXPORT_FORMATS['xlsx'][2],
+                            on_click="ignore",
                             use_container_width=True,
                             key="download_all_publisher"
                         )
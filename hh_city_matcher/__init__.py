@@ -0,0 +1 @@
+"""Ядро синхронизатора гео HH.ru, не зависящее от интерфейса Streamlit"""
@@ -0,0 +1,109 @@
+"""Сокращения и неофициальные названия городов («СПб», «Екб», «Н.Новгород») и префиксы «г.», «пгт».
+
+Таблица читается из aliases.json пакета и дополняется файлом пользователя
+в каталоге данных (тот же формат; его сокращения важнее встроенных), так что
+расширяется без правки кода:
+
+    {"prefixes": ["г", "пгт"], "aliases": {"спб": "Санкт-Петербург", "мск": 1}}
+
+Сокращение указывает на название из справочника HH или на id региона.
+Префикс с точкой в конце («с.», «д.») снимается только вместе с точкой —
+так записываются короткие формы, которые могут оказаться началом названия;
+префикс без точки снимается и перед пробелом, и перед точкой.
+"""
+import hashlib
+import json
+import os
+import re
+
+from .config import DATA_DIR
+from .normalize import name_key
+
+DEFAULT_ALIASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aliases.json')
+
+USER_ALIASES_PATH = os.path.join(DATA_DIR, 'aliases.json')
+
+_DOT_SPACE = re.compile(r'\.\s+')
+
+
+def alias_key(text):
+    """Ключ сокращения: как name_key, но «Н. Новгород» = «Н.Новгород»"""
+    return _DOT_SPACE.sub('.', name_key(text))
+
+
+def load_alias_rules(paths=(DEFAULT_ALIASES_PATH, USER_ALIASES_PATH)):
+    """Префиксы и сокращения из файлов по порядку; отсутствующие файлы пропускаются"""
+    prefixes = []
+    aliases = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                rules = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Не удалось прочитать таблицу сокращений {path}: {e}") from e
+        if not isinstance(rules, dict):
+            raise ValueError(f"Таблица сокращений {path} должна быть объектом с ключами prefixes и aliases")
+        prefixes.extend(prefix for prefix in rules.get('prefixes', []) if prefix not in prefixes)
+        aliases.update(rules.get('aliases', {}))
+    return prefixes, aliases
+
+
+def alias_files_stamp(paths=(DEFAULT_ALIASES_PATH, USER_ALIASES_PATH)):
+    """Время изменения файлов таблицы — чтобы заметить правку без перезапуска"""
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+
+def _prefix_pattern(prefix):
+    """Шаблон префикса: «с.» — только с точкой, «пгт» — с точкой или пробелом"""
+    if prefix.endswith('.'):
+        return rf'{re.escape(prefix)}\s*'
+    return rf'{re.escape(prefix)}(?:\.\s*|\s+)'
+
+
+class AliasTable:
+    """Сокращения → позиции справочника за O(1) и снятие префиксов вида «г.», «пгт».
+
+    Сокращения, цель которых не нашлась в справочнике, попадают в unresolved;
+    digest меняется вместе с содержимым таблицы (для ключей кэшей).
+    """
+
+    def __init__(self, area_store, rules):
+        prefixes, aliases = rules
+        self.positions = {}
+        self.unresolved = []
+        for alias, target in aliases.items():
+            if isinstance(target, int):
+                position = area_store.positions.get(target)
+            else:
+                position = area_store.keys.by_name.get(name_key(target))
+            if position is None:
+                self.unresolved.append((alias, target))
+            else:
+                self.positions[alias_key(alias)] = position
+
+        # Длинные префиксы раньше коротких: «пгт» не должен сниматься как «п»
+        self._prefix = None
+        if prefixes:
+            alternatives = '|'.join(
+                _prefix_pattern(prefix) for prefix in sorted(prefixes, key=len, reverse=True)
+            )
+            self._prefix = re.compile(rf'^(?:{alternatives})(?=\S)', re.IGNORECASE)
+
+        payload = json.dumps([sorted(prefixes), sorted(aliases.items(), key=str)], ensure_ascii=False)
+        self.digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def lookup(self, text):
+        """Позиция справочника по сокращению или None"""
+        return self.positions.get(alias_key(text))
+
+    def strip_prefix(self, text):
+        """Строка без префикса «г.», «пгт» и т. п. (или исходная, если префикса нет)"""
+        text = text.strip()
+        if self._prefix is None:
+            return text
+        return self._prefix.sub('', text, count=1)
@@ -0,0 +1,172 @@
+"""Компактный справочник регионов HH.ru с доступом по id"""
+from array import array
+from functools import lru_cache
+
+from .normalize import AreaKeys
+
+# ID России в справочнике HH
+RUSSIA_ID = 113
+
+# Минимальная длина ключа региона для сравнения по вхождению
+REGION_KEY_MIN_LENGTH = 4
+
+# Сколько разных написаний региона из входных строк запоминать
+REGION_LOOKUP_CACHE_SIZE = 4096
+
+
+class _RegionKeys(tuple):
+    """Пары (ключ, позиции) регионов справочника; для кэша хэшируются по объекту, а не по содержимому"""
+
+    __hash__ = object.__hash__
+
+    def __eq__(self, other):
+        return self is other
+
+
+@lru_cache(maxsize=REGION_LOOKUP_CACHE_SIZE)
+def _find_regions_by_substring(region_keys, region_normalized):
+    """Позиции регионов, ключ которых входит в название или содержит его.
+
+    Кэш общий для процесса и ограничен, поэтому не растёт от входных строк.
+    """
+    found = set()
+    # Короткие ключи («ао», пустые после замен) дают ложные вхождения
+    if len(region_normalized) >= REGION_KEY_MIN_LENGTH:
+        for key, positions in region_keys:
+            if len(key) >= REGION_KEY_MIN_LENGTH and (key in region_normalized or region_normalized in key):
+                found.update(positions)
+    return frozenset(found)
+
+
+class AreaStore:
+    """Справочник HH, ключ — id региона.
+
+    Регионы лежат в порядке обхода дерева; родитель, корень (страна) и регион
+    первого уровня внутри страны хранятся как номера позиций в целочисленных
+    массивах, а названия — отдельной мультикартой название → [id], поэтому
+    одинаковые названия из разных регионов не перетирают друг друга.
+    """
+
+    def __init__(self, areas_tree, version=None):
+        # Версия снимка, из которого построен справочник (для инвалидации кэшей)
+        self.version = version
+        self.ids = array('i')
+        self.names = []
+        self.parents = array('i')
+        self.roots = array('i')
+        # Позиция региона первого уровня (области, края, города федерального значения); -1 у стран
+        self.regions = array('i')
+        self.positions = {}
+        self.name_to_ids = {}
+
+        # Обход в глубину без рекурсии, в том же порядке, что и исходный parse_areas
+        stack = [(area, -1, -1, -1) for area in reversed(areas_tree)]
+        while stack:
+            area, parent_position, root_position, region_position = stack.pop()
+            position = len(self.names)
+            area_id = int(area['id'])
+            area_name = area['name']
+
+            self.ids.append(area_id)
+            self.names.append(area_name)
+            self.parents.append(parent_position)
+            self.roots.append(root_position if root_position >= 0 else position)
+            if region_position < 0 and parent_position >= 0:
+                region_position = position
+            self.regions.append(region_position)
+            self.positions[area_id] = position
+            self.name_to_ids.setdefault(area_name, []).append(area_id)
+
+            for child in reversed(area.get('areas') or []):
+                stack.append((child, position, self.roots[position], region_position))
+
+        # Нормализованные ключи названий считаются один раз при загрузке справочника
+        self.keys = AreaKeys(self.names)
+        # Таблица сокращений (AliasTable); без неё сопоставление обходится названиями справочника
+        self.aliases = None
+
+        # Регионы первого уровня по нормализованному названию — для учёта региона при сопоставлении
+        regions_by_key = {}
+        for position, region_position in enumerate(self.regions):
+            if region_position == position:
+                regions_by_key.setdefault(self.keys.region_keys[position], set()).add(position)
+        self.regions_by_key = {key: frozenset(positions) for key, positions in regions_by_key.items()}
+        self._region_keys = _RegionKeys(self.regions_by_key.items())
+
+    @property
+    def match_version(self):
+        """Версия для кэшей ответов: снимок справочника плюс содержимое таблицы сокращений"""
+        if self.aliases is None:
+            return self.version
+        return f"{self.version}+{self.aliases.digest}"
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, area_id):
+        return area_id in self.positions
+
+    def name(self, area_id):
+        """Название региона по id"""
+        return self.names[self.positions[area_id]]
+
+    def parent_id(self, area_id):
+        """id родителя или None для корневых регионов"""
+        parent_position = self.parents[self.positions[area_id]]
+        return self.ids[parent_position] if parent_position >= 0 else None
+
+    def parent_name(self, area_id):
+        """Название родителя или пустая строка для корневых регионов"""
+        parent_position = self.parents[self.positions[area_id]]
+        return self.names[parent_position] if parent_position >= 0 else ""
+
+    def root_id(self, area_id):
+        """id страны верхнего уровня"""
+        return self.ids[self.roots[self.positions[area_id]]]
+
+    def region_id(self, area_id):
+        """id региона первого уровня, в который входит регион, или None для стран"""
+        region_position = self.regions[self.positions[area_id]]
+        return self.ids[region_position] if region_position >= 0 else None
+
+    def find_regions(self, region_normalized):
+        """Позиции регионов первого уровня по нормализованному названию (см. normalize_region_name).
+
+        Сначала точное совпадение ключа, затем вхождение одного в другое. Справочник
+        при этом не меняется: перебор по вхождению запоминается в ограниченном кэше.
+        """
+        found = self.regions_by_key.get(region_normalized)
+        if found is None:
+            found = _find_regions_by_substring(self._region_keys, region_normalized)
+        return found
+
+    def ids_by_name(self, name):
+        """Все id регионов с таким названием"""
+        return self.name_to_ids.get(name, [])
+
+    def label(self, area_id):
+        """Название для показа пользователю; неоднозначные уточняются родителем, а при том же родителе — id.
+
+        Подписи разных регионов не совпадают: selectbox хранит выбор по подписи.
+        """
+        name = self.name(area_id)
+        namesakes = self.name_to_ids[name]
+        if len(namesakes) > 1:
+            parent_name = self.parent_name(area_id)
+            same_parent = sum(1 for other_id in namesakes if self.parent_name(other_id) == parent_name)
+            if same_parent > 1:
+                return f"{name} ({parent_name + ', ' if parent_name else ''}id {area_id})"
+            if parent_name:
+                return f"{name} ({parent_name})"
+        return name
+
+    def get(self, area_id):
+        """Сведения о регионе в виде словаря (для выгрузок)"""
+        parent_id = self.parent_id(area_id)
+        return {
+            'id': str(area_id),
+            'name': self.name(area_id),
+            'parent': self.parent_name(area_id),
+            'parent_id': str(parent_id) if parent_id is not None else "",
+            'root_parent_id': str(self.root_id(area_id))
+        }
@@ -0,0 +1,300 @@
+"""Воспроизводимый замер скорости и точности сопоставления на замороженном справочнике.
+
+Справочник берётся из файла (см. «freeze»), списки клиента генерируются из
+него же с известными ответами: опечатки, регион после названия, «г.», лишние
+пробелы, повторы и несуществующие названия. Генерация зависит только от
+справочника и seed, поэтому два прогона на разных версиях движка сравнимы.
+Таблица сокращений — только встроенная (или явно заданная --aliases), а не
+файл пользователя из каталога данных.
+
+    python -m hh_city_matcher freeze bench_areas.json.gz
+    python -m hh_city_matcher bench bench_areas.json.gz --json before.json
+
+Небольшой справочник для проверки без API лежит в tests/fixtures/areas.json.gz.
+"""
+import hashlib
+import json
+import random
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .aliases import DEFAULT_ALIASES_PATH, load_alias_rules
+from .engine import match_cities
+from .index import MatcherIndex
+from .matching import get_candidates_batch, match_exact, smart_match_city
+from .normalize import extract_city_and_region, normalize_region_name
+from .regions import CityDirectory
+from .snapshot import load_snapshot
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Доли вариантов в сгенерированном списке (повторы добавляются отдельно)
+CASE_WEIGHTS = (
+    ('exact', 40),
+    ('noise', 10),
+    ('typo', 20),
+    ('region', 15),
+    ('prefix', 5),
+    ('unknown', 10),
+)
+
+# Какая доля строк — повтор одной из предыдущих
+DUPLICATE_SHARE = 0.2
+
+# Сколько запросов меряется по одному (задержка smart_match_city)
+SINGLE_QUERY_SAMPLE = 500
+
+_LETTERS = 'абвгдежзийклмнопрстуфхцчшщыэюя'
+
+
+def load_fixture(path):
+    """Дерево регионов и его версия: снимок формата hh_areas.json.gz или ответ API в .json"""
+    if path.endswith('.gz'):
+        snapshot = load_snapshot(path)
+        if snapshot is None:
+            raise ValueError(f"Не удалось прочитать снимок справочника: {path}")
+        return snapshot.areas, snapshot.version
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    return json.loads(data), hashlib.sha256(data).hexdigest()[:16]
+
+
+def _typo(name, rng):
+    """Одна правка внутри названия: пропуск, перестановка, замена или удвоение буквы"""
+    position = rng.randrange(1, len(name) - 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name[:position] + name[position + 1:]
+    if kind == 1:
+        return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+    if kind == 2:
+        return name[:position] + rng.choice(_LETTERS) + name[position + 1:]
+    return name[:position] + name[position] + name[position:]
+
+
+def _unknown_name(rng):
+    return ''.join(rng.choice(_LETTERS) for _ in range(rng.randrange(7, 12))).capitalize()
+
+
+def generate_cases(area_store, size, seed=0):
+    """Список клиента из size строк: [(строка, ожидаемый id или None, вариант, строго по id)].
+
+    «Строго» — только для строк с регионом: там верен один конкретный id, в
+    остальных подходит любой одноимённый город.
+    """
+    rng = random.Random(f"{seed}|{size}")
+    table = CityDirectory(area_store).table
+    pool = list(zip(table['Город'], table['ID HH'].astype(int)))
+    kinds, weights = zip(*CASE_WEIGHTS)
+
+    cases = []
+    while len(cases) < size:
+        if cases and rng.random() < DUPLICATE_SHARE:
+            text, expected, _, strict = rng.choice(cases)
+            cases.append((text, expected, 'duplicate', strict))
+            continue
+
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'unknown':
+            cases.append((_unknown_name(rng), None, kind, True))
+            continue
+
+        name, area_id = rng.choice(pool)
+        base = name.split('(')[0].strip()
+        strict = False
+        if kind == 'exact':
+            text = name
+        elif kind == 'noise':
+            text = f"  {rng.choice((name.upper(), name.lower()))} "
+        elif kind == 'typo':
+            if len(base) < 6:
+                kind, text = 'exact', name
+            else:
+                text = _typo(base, rng)
+        elif kind == 'region':
+            region_id = area_store.region_id(area_id)
+            if region_id is None or region_id == area_id:
+                kind, text = 'exact', name
+            else:
+                # «Курск Курская обл»
+                region = area_store.name(region_id).replace('область', 'обл')
+                text = f"{base} {region}"
+                strict = True
+        else:
+            text = f"г. {base}"
+        cases.append((text, area_id, kind, strict))
+
+    return cases
+
+
+def _reset_memoization():
+    # Нормализация входных строк мемоизируется — каждый замер начинаем с пустого кэша
+    normalize_region_name.cache_clear()
+    extract_city_and_region.cache_clear()
+
+
+def time_stages(inputs, area_store, candidate_index, threshold):
+    """Время этапов сопоставления на уникальных строках, в том же порядке, что в CityMatcher"""
+    _reset_memoization()
+    unique_cities = {text.strip().lower() for text in inputs if text.strip()}
+
+    started = time.perf_counter()
+    exact_matches = {}
+    for client_city in unique_cities:
+        exact_match = match_exact(client_city, area_store, threshold)
+        if exact_match:
+            exact_matches[client_city] = exact_match
+    exact_done = time.perf_counter()
+
+    fuzzy_cities = unique_cities.difference(exact_matches)
+    batch_candidates = get_candidates_batch(fuzzy_cities, candidate_index)
+    candidates_done = time.perf_counter()
+
+    for client_city in fuzzy_cities:
+        smart_match_city(
+            client_city, area_store, threshold, candidate_index, batch_candidates[client_city], skip_exact=True
+        )
+    match_done = time.perf_counter()
+
+    return {
+        'unique': len(unique_cities),
+        'exact': len(exact_matches),
+        'exact_s': exact_done - started,
+        'candidates_s': candidates_done - exact_done,
+        'fuzzy_match_s': match_done - candidates_done,
+    }
+
+
+def time_single_queries(inputs, area_store, candidate_index, threshold, sample=SINGLE_QUERY_SAMPLE):
+    """Задержка smart_match_city на одиночных запросах (без пакетных кандидатов), мс"""
+    _reset_memoization()
+    queries = list(dict.fromkeys(text.strip() for text in inputs if text.strip()))[:sample]
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        smart_match_city(query, area_store, threshold, candidate_index)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        'queries': len(latencies),
+        'mean_ms': float(np.mean(latencies)) if latencies else 0.0,
+        'p95_ms': float(np.percentile(latencies, 95)) if latencies else 0.0,
+    }
+
+
+def score_accuracy(cases, result_df, area_store):
+    """Доля верных ответов: всего и по вариантам (верно / другой город / не найден)"""
+    matched_ids = [None if pd.isna(value) else int(value) for value in result_df['ID HH']]
+    # Порядок вариантов постоянный, чтобы отчёты разных прогонов читались построчно
+    by_kind = {
+        kind: {'rows': 0, 'correct': 0, 'wrong': 0, 'missed': 0}
+        for kind, _ in CASE_WEIGHTS + (('duplicate', 0),)
+    }
+    for (_, expected, kind, strict), matched in zip(cases, matched_ids):
+        counts = by_kind[kind]
+        counts['rows'] += 1
+        if matched == expected:
+            counts['correct'] += 1
+        elif matched is None:
+            counts['missed'] += 1
+        elif expected is not None and not strict and area_store.name(matched) == area_store.name(expected):
+            # Одноимённый город без указания региона — ответ неоднозначен, засчитываем
+            counts['correct'] += 1
+        else:
+            counts['wrong'] += 1
+
+    correct = sum(counts['correct'] for counts in by_kind.values())
+    return {
+        'accuracy': correct / len(cases) if cases else 0.0,
+        'by_kind': by_kind,
+    }
+
+
+def run_size(index, size, seed=0, threshold=85, processes=None, measure_memory=True):
+    """Замер одного размера списка: сквозной прогон, этапы, одиночные запросы, память, точность"""
+    cases = generate_cases(index.area_store, size, seed)
+    inputs = [text for text, _, _, _ in cases]
+
+    _reset_memoization()
+    started = time.perf_counter()
+    result_df = match_cities(
+        inputs, index.area_store, threshold, processes, candidate_index=index.candidate_index
+    )[0]
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'size': size,
+        'total_s': elapsed,
+        'rows_per_s': size / elapsed if elapsed else 0.0,
+        'stages': time_stages(inputs, index.area_store, index.candidate_index, threshold),
+        'single': time_single_queries(inputs, index.area_store, index.candidate_index, threshold),
+        'peak_mb': None,
+    }
+
+    if measure_memory:
+        # Отдельный прогон: tracemalloc заметно замедляет выполнение и исказил бы время
+        _reset_memoization()
+        tracemalloc.start()
+        try:
+            match_cities(inputs, index.area_store, threshold, processes, candidate_index=index.candidate_index)
+            report['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    report.update(score_accuracy(cases, result_df, index.area_store))
+    return report
+
+
+def run_benchmark(fixture_path, sizes=DEFAULT_SIZES, seed=0, threshold=85,
+                  processes=None, measure_memory=True, progress=None, aliases_path=None):
+    """Полный замер по файлу справочника; progress(report) вызывается после каждого размера.
+
+    aliases_path — файл сокращений поверх встроенного; без него только встроенная таблица.
+    """
+    areas_tree, version = load_fixture(fixture_path)
+    alias_paths = [DEFAULT_ALIASES_PATH] + ([aliases_path] if aliases_path else [])
+    alias_rules = load_alias_rules(alias_paths)
+
+    started = time.perf_counter()
+    index = MatcherIndex(areas_tree, version, alias_rules)
+    index_s = time.perf_counter() - started
+
+    runs = []
+    for size in sizes:
+        runs.append(run_size(index, size, seed, threshold, processes, measure_memory))
+        if progress is not None:
+            progress(runs[-1])
+
+    return {
+        'fixture': {'path': fixture_path, 'version': version, 'areas': len(index.area_store)},
+        'aliases': {'paths': alias_paths, 'digest': index.area_store.aliases.digest},
+        'seed': seed,
+        'threshold': threshold,
+        'processes': processes,
+        'index_build_s': index_s,
+        'runs': runs,
+    }
+
+
+def format_run(run):
+    """Строки отчёта по одному размеру списка"""
+    stages = run['stages']
+    single = run['single']
+    lines = [
+        f"{run['size']} строк: {run['total_s']:.2f} с, {run['rows_per_s']:.0f} строк/с"
+        + (f", пик памяти {run['peak_mb']:.1f} МБ" if run['peak_mb'] is not None else ""),
+        f"  этапы ({stages['unique']} уникальных, {stages['exact']} точных): "
+        f"точные {stages['exact_s']:.2f} с, кандидаты {stages['candidates_s']:.2f} с, "
+        f"нечёткие {stages['fuzzy_match_s']:.2f} с",
+        f"  одиночный запрос: {single['mean_ms']:.2f} мс в среднем, p95 {single['p95_ms']:.2f} мс",
+        f"  точность: {run['accuracy']:.1%}",
+    ]
+    for kind, counts in run['by_kind'].items():
+        lines.append(
+            f"    {kind}: {counts['correct']}/{counts['rows']} верно, "
+            f"{counts['wrong']} другой город, {counts['missed']} не найдено"
+        )
+    return lines
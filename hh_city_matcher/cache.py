@@ -0,0 +1,153 @@
+"""Постоянный кэш результатов сопоставления между сессиями и запусками (SQLite)"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from .config import DATA_DIR
+
+DEFAULT_CACHE_PATH = os.path.join(DATA_DIR, 'match_cache.sqlite3')
+
+# Верхняя граница числа записей; при превышении удаляются давно не использованные
+DEFAULT_MAX_ENTRIES = 100000
+
+# Увеличивается при изменении логики сопоставления, чтобы старые ответы не переиспользовались
+MATCHER_VERSION = 5
+
+# Сколько последних версий справочника держать в кэше одновременно
+DEFAULT_MAX_VERSIONS = 4
+
+# Ограничение SQLite на число параметров в одном запросе
+_SQL_BATCH = 500
+
+
+class MatchCache:
+    """Кэш: (версия справочника, нормализованная строка, порог) → совпадение и кандидаты.
+
+    Записи разных версий лежат рядом, поэтому сессии и задания на разных
+    снимках или таблицах сокращений не сбрасывают кэш друг друга; версии,
+    которыми дольше всего не пользовались, удаляются сверх max_versions.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_versions=DEFAULT_MAX_VERSIONS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            columns = {row[1] for row in connection.execute('PRAGMA table_info(matches)')}
+            if columns and 'version' not in columns:
+                # Кэш прежнего формата с одной версией на всю таблицу — ответы в нём одноразовые
+                connection.execute('DROP TABLE matches')
+                connection.execute('DROP TABLE IF EXISTS meta')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS matches ('
+                ' version TEXT NOT NULL,'
+                ' input TEXT NOT NULL,'
+                ' threshold INTEGER NOT NULL,'
+                ' area_id INTEGER,'
+                ' score REAL,'
+                ' candidates TEXT,'
+                ' used_at REAL NOT NULL,'
+                ' PRIMARY KEY (version, input, threshold))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS matches_used_at ON matches (used_at)')
+
+    @contextmanager
+    def _connect(self):
+        # Отдельное соединение на вызов: Streamlit обслуживает сессии в разных потоках
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _version_key(version):
+        """Ключ версии записей: снимок справочника плюс версия логики сопоставления"""
+        return f"{version}:{MATCHER_VERSION}"
+
+    def get_many(self, inputs, threshold, version):
+        """Возвращает {строка: (совпадение или None, кандидаты или None)} для найденных в кэше"""
+        inputs = list(inputs)
+        found = {}
+        if not inputs:
+            return found
+
+        now = time.time()
+        version = self._version_key(version)
+        with self._connect() as connection:
+            for start in range(0, len(inputs), _SQL_BATCH):
+                batch = inputs[start:start + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = connection.execute(
+                    f'SELECT input, area_id, score, candidates FROM matches'
+                    f' WHERE version = ? AND threshold = ? AND input IN ({placeholders})',
+                    [version, threshold, *batch]
+                ).fetchall()
+                for client_city, area_id, score, candidates in rows:
+                    match_result = (area_id, score, 0) if area_id is not None else None
+                    if candidates is not None:
+                        candidates = [tuple(candidate) for candidate in json.loads(candidates)]
+                    found[client_city] = (match_result, candidates)
+
+                connection.execute(
+                    f'UPDATE matches SET used_at = ?'
+                    f' WHERE version = ? AND threshold = ? AND input IN ({placeholders})',
+                    [now, version, threshold, *batch]
+                )
+
+        return found
+
+    def put_many(self, entries, threshold, version):
+        """Сохраняет {строка: (совпадение или None, кандидаты или None)}"""
+        if not entries:
+            return
+
+        now = time.time()
+        version = self._version_key(version)
+        rows = []
+        for client_city, (match_result, candidates) in entries.items():
+            area_id, score = (match_result[0], match_result[1]) if match_result else (None, None)
+            rows.append((
+                version, client_city, threshold, area_id, score,
+                json.dumps(candidates) if candidates is not None else None,
+                now
+            ))
+
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO matches (version, input, threshold, area_id, score, candidates, used_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._prune_versions(connection)
+            self._evict(connection)
+
+    def _prune_versions(self, connection):
+        # Версии, которыми дольше всего не пользовались, удаляются целиком
+        connection.execute(
+            'DELETE FROM matches WHERE version NOT IN'
+            ' (SELECT version FROM matches GROUP BY version ORDER BY MAX(used_at) DESC LIMIT ?)',
+            (self.max_versions,)
+        )
+
+    def _evict(self, connection):
+        count = connection.execute('SELECT COUNT(*) FROM matches').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            # Удаляем с запасом, чтобы не чистить кэш на каждой записи
+            excess += self.max_entries // 10
+            connection.execute(
+                'DELETE FROM matches WHERE rowid IN'
+                ' (SELECT rowid FROM matches ORDER BY used_at LIMIT ?)',
+                (excess,)
+            )
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM matches')
@@ -0,0 +1,64 @@
+"""Компактное хранение кандидатов для ручной проверки"""
+import numpy as np
+
+# Предел памяти под кандидатов одного прогона (одной сессии)
+MAX_CANDIDATE_BYTES = 16 * 1024 * 1024
+
+# Байт на кандидата: id региона (int32) и оценка (float32)
+_CANDIDATE_BYTES = 8
+# Байт на строку: row_id (int64) и смещение (int32)
+_ROW_BYTES = 12
+
+
+class CandidateStore:
+    """Кандидаты по row_id в плоских массивах вместо списков кортежей.
+
+    Кандидаты всех строк лежат подряд в массивах id (int32) и оценок (float32),
+    строка находит свой отрезок по смещениям. Строки сверх max_bytes не
+    сохраняются (их число — dropped_rows): для них, как и для строк без
+    посчитанных кандидатов, get() возвращает None, и кандидатов нужно
+    посчитать заново.
+    """
+
+    def __init__(self, candidates=None, max_bytes=MAX_CANDIDATE_BYTES):
+        candidates = candidates or {}
+        row_ids = sorted(candidates)
+
+        stored = 0
+        size = 0
+        for row_id in row_ids:
+            row_size = _ROW_BYTES + _CANDIDATE_BYTES * len(candidates[row_id])
+            if max_bytes is not None and size + row_size > max_bytes:
+                break
+            size += row_size
+            stored += 1
+        row_ids = row_ids[:stored]
+
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        lengths = [len(candidates[row_id]) for row_id in row_ids]
+        self.offsets = np.zeros(len(row_ids) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.area_ids = np.fromiter(
+            (area_id for row_id in row_ids for area_id, _ in candidates[row_id]),
+            dtype=np.int32, count=int(self.offsets[-1])
+        )
+        self.scores = np.fromiter(
+            (score for row_id in row_ids for _, score in candidates[row_id]),
+            dtype=np.float32, count=int(self.offsets[-1])
+        )
+        self.dropped_rows = len(candidates) - stored
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    @property
+    def nbytes(self):
+        return self.row_ids.nbytes + self.offsets.nbytes + self.area_ids.nbytes + self.scores.nbytes
+
+    def get(self, row_id):
+        """[(id, оценка)] для строки; [] — кандидатов нет; None — не сохранены"""
+        index = int(np.searchsorted(self.row_ids, row_id))
+        if index == len(self.row_ids) or self.row_ids[index] != row_id:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return list(zip(self.area_ids[start:end].tolist(), self.scores[start:end].tolist()))
@@ -0,0 +1,244 @@
+"""Пакетное сопоставление файлов из командной строки, без интерфейса Streamlit
+
+    python -m hh_city_matcher match cities.xlsx -o result.xlsx --threshold 85
+    python -m hh_city_matcher bench bench_areas.json.gz --sizes 1000 10000
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import pandas as pd
+from openpyxl import Workbook
+
+from .aliases import AliasTable, load_alias_rules
+from .areas import AreaStore
+from .bench import DEFAULT_SIZES, format_run, run_benchmark
+from .cache import DEFAULT_CACHE_PATH, MatchCache
+from .corrections import DEFAULT_CORRECTIONS_PATH, CorrectionStore
+from .districts import DistrictMap
+from .engine import CityMatcher
+from .ingest import DEFAULT_CHUNK_SIZE, estimate_row_count, iter_first_column
+from .progress import ConsoleProgress, ProgressReporter
+from .snapshot import DEFAULT_SNAPSHOT_PATH, AreasProvider, save_snapshot
+from .stats import MatchStats
+
+# Колонки полного отчёта — те же, что в «📥 Скачать полный отчет»
+REPORT_COLUMNS = [
+    'Исходное название', 'Итоговое гео', 'ID HH', 'Регион',
+    'Совпадение %', 'Изменение', 'Статус'
+]
+
+
+class ResultWriter:
+    """Построчная запись результатов в CSV или XLSX (write-only книга openpyxl)"""
+
+    def __init__(self, path, columns, header=True, sheet_name='Результат'):
+        self.path = path
+        self.columns = columns
+        self.is_csv = path.lower().endswith('.csv')
+
+        if self.is_csv:
+            self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file)
+            if header:
+                self._writer.writerow(columns)
+        else:
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet(sheet_name)
+            if header:
+                self._sheet.append(columns)
+
+    def write(self, results):
+        for result in results:
+            row = [None if pd.isna(result[column]) else result[column] for column in self.columns]
+            if self.is_csv:
+                self._writer.writerow(row)
+            else:
+                self._sheet.append(row)
+
+    def close(self):
+        if self.is_csv:
+            self._file.close()
+        else:
+            self._workbook.save(self.path)
+
+
+def load_areas_snapshot(snapshot_path, offline=False):
+    """Снимок справочника; без offline устаревший снимок сверяется с API"""
+    provider = AreasProvider(snapshot_path)
+    if offline:
+        # Сверка не нужна — интервал «никогда не истекает»
+        provider.revalidate_interval = float('inf')
+    snapshot = provider.get(background=False)
+    if provider.last_error is not None:
+        print(f"⚠️ API HH.ru недоступно, используется снимок: {provider.last_error}", file=sys.stderr)
+    return snapshot
+
+
+def load_area_store(snapshot_path, offline=False):
+    """Загружает справочник из снимка (с таблицей сокращений); без offline устаревший снимок сверяется с API"""
+    snapshot = load_areas_snapshot(snapshot_path, offline)
+    area_store = AreaStore(snapshot.areas, snapshot.version)
+    area_store.aliases = AliasTable(area_store, load_alias_rules())
+    return area_store
+
+
+def run_match(args):
+    started = time.perf_counter()
+    area_store = load_area_store(args.snapshot, args.offline)
+
+    output = args.output
+    if output is None:
+        base_name = os.path.splitext(os.path.basename(args.input))[0]
+        prefix = 'geo_for_publisher_' if args.publisher else 'result_'
+        output = os.path.join(os.path.dirname(args.input), f"{prefix}{base_name}.xlsx")
+
+    if args.publisher:
+        writer = ResultWriter(output, ['Итоговое гео'], header=False, sheet_name='Гео')
+    else:
+        writer = ResultWriter(output, REPORT_COLUMNS)
+
+    # Кандидаты нужны только редактору в интерфейсе — в пакетном режиме не копим их
+    match_cache = None if args.no_cache else MatchCache(args.cache)
+    corrections = None if args.no_corrections else CorrectionStore(args.corrections)
+    stats = MatchStats() if args.stats else None
+    matcher = CityMatcher(
+        area_store, args.threshold, args.processes,
+        keep_candidates=False, match_cache=match_cache, stats=stats, corrections=corrections
+    )
+    if args.quiet:
+        progress = ProgressReporter()
+    else:
+        progress = ConsoleProgress(estimate_row_count(args.input, args.input))
+
+    statuses = Counter()
+    complete = False
+    try:
+        for chunk in iter_first_column(args.input, args.input, args.chunk_size):
+            results = matcher.match_chunk(chunk, progress)
+            statuses.update(result['Статус'] for result in results)
+
+            if args.publisher:
+                # Для публикатора — только уникальные найденные города
+                results = [
+                    result for result in results
+                    if 'Дубликат' not in result['Статус'] and result['Итоговое гео'] is not None
+                ]
+            writer.write(results)
+        complete = True
+    finally:
+        progress.finish(complete)
+        # Сохраняем уже обработанные строки даже при прерывании (Ctrl+C)
+        writer.close()
+        if stats is not None:
+            with open(args.stats, 'w', encoding='utf-8') as f:
+                f.write(stats.to_json())
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - started
+        print(f"Готово: {matcher.rows_processed} строк за {elapsed:.1f} с → {output}", file=sys.stderr)
+        for status, count in statuses.most_common():
+            print(f"  {status}: {count}", file=sys.stderr)
+
+    return 0
+
+
+def run_districts(args):
+    """Проверяет, что все регионы списка округов есть в справочнике и наоборот"""
+    area_store = load_area_store(args.snapshot, args.offline)
+    district_map = DistrictMap(area_store)
+    for line in district_map.report():
+        print(line)
+    if not args.quiet:
+        print(f"Сопоставлено регионов: {len(district_map.region_ids)}", file=sys.stderr)
+    return 0 if district_map.is_complete else 1
+
+
+def run_freeze(args):
+    """Сохраняет текущий справочник в отдельный файл — неизменный набор для замеров"""
+    snapshot = load_areas_snapshot(args.snapshot, args.offline)
+    save_snapshot(snapshot, args.output)
+    if not args.quiet:
+        print(f"Справочник версии {snapshot.version} сохранён в {args.output}", file=sys.stderr)
+    return 0
+
+
+def run_bench(args):
+    """Замер скорости, памяти и точности на замороженном справочнике"""
+    def print_run(run):
+        print('\n'.join(format_run(run)), flush=True)
+
+    report = run_benchmark(
+        args.fixture, args.sizes, args.seed, args.threshold, args.processes,
+        measure_memory=not args.no_memory, progress=print_run, aliases_path=args.aliases
+    )
+    print(f"Справочник {report['fixture']['version']}: {report['fixture']['areas']} регионов, "
+          f"индекс построен за {report['index_build_s']:.2f} с")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='hh-city-matcher',
+        description='Синхронизатор гео HH.ru: сопоставление городов со справочником HH'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    match = commands.add_parser('match', help='Сопоставить города из первой колонки файла')
+    match.add_argument('input', help='Файл с городами (.xlsx или .csv, без заголовков)')
+    match.add_argument('-o', '--output', help='Куда записать результат (.xlsx или .csv)')
+    match.add_argument('--threshold', type=int, default=85, help='Порог совпадения, %% (по умолчанию 85)')
+    match.add_argument('--processes', type=int, default=None, help='Число процессов для расчёта кандидатов')
+    match.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Строк за один шаг')
+    match.add_argument('--publisher', action='store_true', help='Записать только файл для публикатора')
+    match.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_PATH, help='Путь к снимку справочника HH')
+    match.add_argument('--offline', action='store_true', help='Не обращаться к API HH.ru, если есть снимок')
+    match.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='Путь к кэшу сопоставлений')
+    match.add_argument('--no-cache', action='store_true', help='Не использовать кэш сопоставлений')
+    match.add_argument('--corrections', default=DEFAULT_CORRECTIONS_PATH, help='Путь к хранилищу ручных исправлений')
+    match.add_argument('--no-corrections', action='store_true', help='Не подставлять сохранённые ручные исправления')
+    match.add_argument('--stats', help='Сохранить в JSON попадания и время по этапам сопоставления')
+    match.add_argument('-q', '--quiet', action='store_true', help='Не выводить прогресс')
+    match.set_defaults(handler=run_match)
+
+    districts = commands.add_parser('districts', help='Проверить список федеральных округов по справочнику')
+    districts.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_PATH, help='Путь к снимку справочника HH')
+    districts.add_argument('--offline', action='store_true', help='Не обращаться к API HH.ru, если есть снимок')
+    districts.add_argument('-q', '--quiet', action='store_true', help='Не выводить итог')
+    districts.set_defaults(handler=run_districts)
+
+    freeze = commands.add_parser('freeze', help='Сохранить справочник в файл для замеров')
+    freeze.add_argument('output', help='Куда записать справочник (.json.gz)')
+    freeze.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_PATH, help='Путь к снимку справочника HH')
+    freeze.add_argument('--offline', action='store_true', help='Не обращаться к API HH.ru, если есть снимок')
+    freeze.add_argument('-q', '--quiet', action='store_true', help='Не выводить итог')
+    freeze.set_defaults(handler=run_freeze)
+
+    bench = commands.add_parser('bench', help='Замерить скорость и точность на сгенерированных списках')
+    bench.add_argument('fixture', help='Справочник из freeze (.json.gz) или ответ API (.json)')
+    bench.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Размеры списков')
+    bench.add_argument('--seed', type=int, default=0, help='Seed генератора списков')
+    bench.add_argument('--threshold', type=int, default=85, help='Порог совпадения, %% (по умолчанию 85)')
+    bench.add_argument('--processes', type=int, default=None, help='Число процессов для расчёта кандидатов')
+    bench.add_argument('--no-memory', action='store_true', help='Не замерять пик памяти (отдельный прогон)')
+    bench.add_argument('--aliases', help='Файл сокращений поверх встроенного (по умолчанию только встроенный)')
+    bench.add_argument('--json', help='Сохранить отчёт в JSON для сравнения прогонов')
+    bench.set_defaults(handler=run_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except Exception as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,11 @@
+"""Общие настройки: адрес API HH.ru и каталог локальных данных"""
+import os
+
+# Справочник регионов HH.ru
+HH_AREAS_URL = os.environ.get('HH_AREAS_URL', 'https://api.hh.ru/areas')
+
+# Каталог для снимков справочника, кэшей и прочих локальных файлов
+DATA_DIR = os.environ.get(
+    'HH_CITY_MATCHER_DATA_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'hh-city-matcher')
+)
@@ -0,0 +1,207 @@
+"""Ручные исправления из редактора, сохранённые между сессиями (SQLite).
+
+Исправление — подтверждённый ответ на входную строку: id региона HH или
+«совпадения нет». При следующих загрузках такие строки разрешаются сразу,
+раньше кэша и любых этапов сопоставления.
+"""
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .config import DATA_DIR
+from .normalize import name_key
+
+DEFAULT_CORRECTIONS_PATH = os.path.join(DATA_DIR, 'corrections.sqlite3')
+
+# Ограничение SQLite на число параметров в одном запросе
+_SQL_BATCH = 500
+
+# Исправление, которое не записано: после загрузки результатов его уже поменял кто-то другой
+Conflict = namedtuple('Conflict', 'input saved_area_id new_area_id')
+
+SaveResult = namedtuple('SaveResult', 'saved unchanged conflicts')
+
+
+def _as_match(area_id, area_store):
+    """(id, 100.0, 0), None для «совпадения нет» или False, если региона нет в снимке"""
+    if area_id is None:
+        return None
+    if area_id in area_store:
+        return (area_id, 100.0, 0)
+    return False
+
+
+class CorrectionStore:
+    """Исправления по нормализованной строке (name_key) с версиями и историей.
+
+    У каждой строки своя версия, растущая с каждым изменением ответа, а у
+    хранилища — сквозная ревизия (номер сохранения). Сохранение с
+    base_revision не перезаписывает ответы, изменённые после этой ревизии
+    на другие: они возвращаются как конфликты, пока не сохранены с force.
+    """
+
+    def __init__(self, path=DEFAULT_CORRECTIONS_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            # area_id NULL — подтверждено, что совпадения нет
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS corrections ('
+                ' input TEXT PRIMARY KEY,'
+                ' area_id INTEGER,'
+                ' version INTEGER NOT NULL,'
+                ' revision INTEGER NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS history ('
+                ' input TEXT NOT NULL,'
+                ' version INTEGER NOT NULL,'
+                ' area_id INTEGER,'
+                ' revision INTEGER NOT NULL,'
+                ' source TEXT,'
+                ' saved_at REAL NOT NULL,'
+                ' PRIMARY KEY (input, version))'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+
+    @contextmanager
+    def _connect(self):
+        # Отдельное соединение на вызов: Streamlit обслуживает сессии в разных потоках
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute('SELECT COUNT(*) FROM corrections').fetchone()[0]
+
+    @property
+    def revision(self):
+        """Номер последнего сохранения (0 — исправлений ещё не было)"""
+        with self._connect() as connection:
+            return self._revision(connection)
+
+    @staticmethod
+    def _revision(connection):
+        row = connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return row[0] if row else 0
+
+    def get_many(self, inputs):
+        """{строка: id или None (совпадения нет)} для строк, у которых есть исправление"""
+        keys = {}
+        for client_city in inputs:
+            keys.setdefault(name_key(client_city), []).append(client_city)
+        found = {}
+        if not keys:
+            return found
+
+        key_list = list(keys)
+        with self._connect() as connection:
+            for start in range(0, len(key_list), _SQL_BATCH):
+                batch = key_list[start:start + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = connection.execute(
+                    f'SELECT input, area_id FROM corrections WHERE input IN ({placeholders})', batch
+                ).fetchall()
+                for key, area_id in rows:
+                    for client_city in keys[key]:
+                        found[client_city] = area_id
+        return found
+
+    def match_many(self, inputs, area_store):
+        """{строка: (id, 100.0, 0) или None} по исправлениям, действующим в снимке area_store.
+
+        Исправления на регион, которого нет в снимке, пропускаются — такие
+        строки сопоставляются как обычно.
+        """
+        matches = {}
+        for client_city, area_id in self.get_many(inputs).items():
+            match_result = _as_match(area_id, area_store)
+            if match_result is not False:
+                matches[client_city] = match_result
+        return matches
+
+    def load(self, area_store):
+        """Все действующие в снимке исправления: {name_key: (id, 100.0, 0) или None}.
+
+        Для одиночных вызовов smart_match_city: хранилище читается один раз,
+        дальше каждая строка — поиск в словаре.
+        """
+        with self._connect() as connection:
+            rows = connection.execute('SELECT input, area_id FROM corrections').fetchall()
+        matches = {}
+        for key, area_id in rows:
+            match_result = _as_match(area_id, area_store)
+            if match_result is not False:
+                matches[key] = match_result
+        return matches
+
+    def save(self, corrections, base_revision=None, force=False, source=None):
+        """Сохраняет {строка: id или None}; возвращает SaveResult(сохранено, без изменений, конфликты).
+
+        base_revision — ревизия, при которой пользователь видел результаты;
+        без неё (или с force) ответы перезаписываются безусловно.
+        """
+        entries = {}
+        for client_city, area_id in corrections.items():
+            key = name_key(str(client_city))
+            if key:
+                entries[key] = (client_city, None if area_id is None else int(area_id))
+
+        saved = 0
+        unchanged = 0
+        conflicts = []
+        now = time.time()
+        with self._connect() as connection:
+            # Ревизия и проверка конфликтов — в одной транзакции записи
+            connection.execute('BEGIN IMMEDIATE')
+            revision = self._revision(connection) + 1
+            for key, (client_city, area_id) in entries.items():
+                row = connection.execute(
+                    'SELECT area_id, version, revision FROM corrections WHERE input = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    saved_area_id, version, saved_revision = row
+                    if saved_area_id == area_id:
+                        unchanged += 1
+                        continue
+                    if not force and base_revision is not None and saved_revision > base_revision:
+                        conflicts.append(Conflict(client_city, saved_area_id, area_id))
+                        continue
+                    version += 1
+                else:
+                    version = 1
+
+                connection.execute(
+                    'INSERT OR REPLACE INTO corrections (input, area_id, version, revision, updated_at)'
+                    ' VALUES (?, ?, ?, ?, ?)',
+                    (key, area_id, version, revision, now)
+                )
+                connection.execute(
+                    'INSERT INTO history (input, version, area_id, revision, source, saved_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, version, area_id, revision, source, now)
+                )
+                saved += 1
+
+            if saved:
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (revision,)
+                )
+        return SaveResult(saved, unchanged, conflicts)
+
+    def history(self, client_city):
+        """[(версия, id или None, ревизия, источник, время)] ответов на строку, от первого"""
+        with self._connect() as connection:
+            return connection.execute(
+                'SELECT version, area_id, revision, source, saved_at FROM history'
+                ' WHERE input = ? ORDER BY version',
+                (name_key(client_city),)
+            ).fetchall()
@@ -0,0 +1,163 @@
+"""Федеральные округа России и их регионы, привязанные к id справочника HH"""
+import re
+
+from .areas import RUSSIA_ID
+
+# Округ → регионы, как они называются в официальном перечне субъектов
+FEDERAL_DISTRICTS = {
+    "Центральный федеральный округ": [
+        "Белгородская область", "Брянская область", "Владимирская область",
+        "Воронежская область", "Ивановская область", "Калужская область",
+        "Костромская область", "Курская область", "Липецкая область",
+        "Московская область", "Орловская область", "Рязанская область",
+        "Смоленская область", "Тамбовская область", "Тверская область",
+        "Тульская область", "Ярославская область", "Москва"
+    ],
+    "Южный федеральный округ": [
+        "Республика Адыгея", "Республика Калмыкия", "Краснодарский край",
+        "Астраханская область", "Волгоградская область", "Ростовская область"
+    ],
+    "Северо-Западный федеральный округ": [
+        "Республика Карелия", "Республика Коми", "Архангельская область",
+        "Вологодская область", "Калининградская область", "Ленинградская область",
+        "Мурманская область", "Новгородская область", "Псковская область",
+        "Санкт-Петербург", "Ненецкий автономный округ"
+    ],
+    "Дальневосточный федеральный округ": [
+        "Республика Саха (Якутия)", "Камчатский край", "Приморский край",
+        "Хабаровский край", "Амурская область", "Магаданская область",
+        "Сахалинская область", "Еврейская автономная область", "Чукотский автономный округ"
+    ],
+    "Сибирский федеральный округ": [
+        "Республика Алтай", "Республика Бурятия", "Республика Тыва",
+        "Республика Хакасия", "Алтайский край", "Забайкальский край",
+        "Красноярский край", "Иркутская область", "Кемеровская область",
+        "Новосибирская область", "Омская область", "Томская область"
+    ],
+    "Уральский федеральный округ": [
+        "Курганская область", "Свердловская область", "Тюменская область",
+        "Челябинская область", "Ханты-Мансийский автономный округ — Югра",
+        "Ямало-Ненецкий автономный округ"
+    ],
+    "Приволжский федеральный округ": [
+        "Республика Башкортостан", "Республика Марий Эл", "Республика Мордовия",
+        "Республика Татарстан", "Удмуртская Республика", "Чувашская Республика",
+        "Кировская область", "Нижегородская область", "Оренбургская область",
+        "Пензенская область", "Пермский край", "Самарская область",
+        "Саратовская область", "Ульяновская область"
+    ],
+    "Северо-Кавказский федеральный округ": [
+        "Республика Дагестан", "Республика Ингушетия", "Кабардино-Балкарская Республика",
+        "Карачаево-Черкесская Республика", "Республика Северная Осетия — Алания",
+        "Чеченская Республика", "Ставропольский край"
+    ],
+    "Крымский федеральный округ": [
+        "Республика Крым", "Севастополь"
+    ]
+}
+
+# Полные формы, которые в справочнике HH записаны сокращённо
+_NAME_ABBREVIATIONS = (
+    ('автономный округ', 'ао'),
+    ('автономная область', 'ао'),
+)
+
+_DASH = re.compile(r'\s*[-–—]\s*')
+
+
+def region_name_key(name):
+    """Ключ для сравнения названий регионов: «Ханты-Мансийский автономный округ — Югра» = «Ханты-Мансийский АО - Югра»"""
+    key = ' '.join(name.lower().replace('ё', 'е').split())
+    for full, short in _NAME_ABBREVIATIONS:
+        key = key.replace(full, short)
+    return _DASH.sub('-', key)
+
+
+def _match_by_substring(region_key, hh_regions):
+    """id единственного региона, название которого содержит ключ или входит в него"""
+    found = {
+        region_id for key, region_id in hh_regions.items()
+        if region_key in key or key in region_key
+    }
+    return found.pop() if len(found) == 1 else None
+
+
+class DistrictMap:
+    """Округ → регионы → города по id справочника HH.
+
+    Названия регионов из FEDERAL_DISTRICTS один раз сопоставляются с регионами
+    первого уровня страны; дальше принадлежность проверяется по id. Название
+    без точной пары сопоставляется по вхождению, как раньше сравнивались
+    регионы по parent («Кемеровская область» ↔ «Кемеровская область - Кузбасс»),
+    если такой регион единственный. Что сопоставить не удалось, попадает в
+    отчёт (unmapped, unassigned).
+    """
+
+    def __init__(self, area_store, districts=FEDERAL_DISTRICTS, country_id=RUSSIA_ID):
+        self.districts = districts
+
+        # Регионы первого уровня страны по ключу названия
+        hh_regions = {}
+        if country_id in area_store:
+            country_position = area_store.positions[country_id]
+            for position, region_position in enumerate(area_store.regions):
+                if region_position == position and area_store.roots[position] == country_position:
+                    hh_regions.setdefault(region_name_key(area_store.names[position]), area_store.ids[position])
+
+        # Название из списка → id; сначала точные пары, затем остальные по вхождению
+        self.region_ids = {}
+        unresolved = []
+        for district, regions in districts.items():
+            for region in regions:
+                region_id = hh_regions.get(region_name_key(region))
+                if region_id is None:
+                    unresolved.append((district, region))
+                else:
+                    self.region_ids[region] = region_id
+
+        # Названия без пары в справочнике — с указанием округа
+        self.approximate = []
+        self.unmapped = []
+        exact_ids = set(self.region_ids.values())
+        free_regions = {key: region_id for key, region_id in hh_regions.items() if region_id not in exact_ids}
+        for district, region in unresolved:
+            region_id = _match_by_substring(region_name_key(region), free_regions)
+            if region_id is None:
+                self.unmapped.append((district, region))
+            else:
+                self.region_ids[region] = region_id
+                self.approximate.append((region, area_store.name(region_id)))
+
+        # Регионы справочника, не вошедшие ни в один округ
+        mapped_ids = set(self.region_ids.values())
+        self.unassigned = sorted(
+            area_store.name(region_id) for region_id in hh_regions.values()
+            if region_id not in mapped_ids
+        )
+
+    @property
+    def is_complete(self):
+        return not self.unmapped and not self.unassigned
+
+    def ids_for_regions(self, regions):
+        """id регионов HH по названиям из списка округов; несопоставленные пропускаются"""
+        return [self.region_ids[region] for region in regions if region in self.region_ids]
+
+    def ids_for_districts(self, districts):
+        """id всех сопоставленных регионов выбранных округов"""
+        return [
+            region_id
+            for district in districts
+            for region_id in self.ids_for_regions(self.districts[district])
+        ]
+
+    def report(self):
+        """Строки отчёта о проверке соответствия округов справочнику"""
+        lines = []
+        for region, hh_name in self.approximate:
+            lines.append(f"Сопоставлено по вхождению: {region} → {hh_name}")
+        for district, region in self.unmapped:
+            lines.append(f"Нет в справочнике HH: {region} ({district})")
+        for region in self.unassigned:
+            lines.append(f"Не входит ни в один округ: {region}")
+        return lines
@@ -0,0 +1,297 @@
+"""Сопоставление списка городов клиента: порядок строк, дубликаты, кандидаты"""
+import time
+
+import pandas as pd
+
+from .matching import (
+    CandidateIndex, check_if_changed, get_candidates_batch, match_exact, smart_match_city
+)
+from .parallel import get_candidates_parallel
+
+# Строки с совпадением не выше этого попадают в ручную проверку и им нужны кандидаты
+REVIEW_MAX_SCORE = 90
+
+# Статус строки, для которой сохранено исправление «совпадения нет»: проверять её повторно не нужно
+CONFIRMED_NO_MATCH = '❌ Не найдено (исправление)'
+
+
+class CityMatcher:
+    """Состояние одного прогона сопоставления.
+
+    Строки можно подавать порциями: дубликаты по исходному названию и по
+    результату HH, счётчики и кандидаты сохраняются между порциями, а
+    row_id продолжает сквозную нумерацию.
+    """
+
+    def __init__(self, area_store, threshold=85, processes=None, candidate_index=None,
+                 keep_candidates=True, match_cache=None, stats=None, corrections=None):
+        self.area_store = area_store
+        self.threshold = threshold
+        self.processes = processes
+        self.keep_candidates = keep_candidates
+        self.candidate_index = candidate_index or CandidateIndex(area_store)
+        # Кэш привязан к версии снимка; без версии переиспользовать ответы нельзя
+        self.match_cache = match_cache if area_store.version else None
+        # MatchStats для замеров по этапам; без него движок ничего не замеряет
+        self.stats = stats
+        # CorrectionStore с ручными исправлениями; они важнее кэша и любых этапов
+        self.corrections = corrections
+
+        self.seen_original_cities = {}
+        self.seen_hh_cities = {}
+        self.duplicate_original_count = 0
+        self.duplicate_hh_count = 0
+        self.candidates = {}
+        self.rows_processed = 0
+
+    @property
+    def total_duplicates(self):
+        return self.duplicate_original_count + self.duplicate_hh_count
+
+    def get_state(self):
+        """Состояние между порциями (без кандидатов) — для сохранения контрольной точки"""
+        return {
+            'seen_original_cities': self.seen_original_cities,
+            'seen_hh_cities': self.seen_hh_cities,
+            'duplicate_original_count': self.duplicate_original_count,
+            'duplicate_hh_count': self.duplicate_hh_count,
+            'rows_processed': self.rows_processed,
+        }
+
+    def set_state(self, state):
+        """Продолжение прогона с сохранённого состояния"""
+        self.seen_original_cities = state['seen_original_cities']
+        self.seen_hh_cities = state['seen_hh_cities']
+        self.duplicate_original_count = state['duplicate_original_count']
+        self.duplicate_hh_count = state['duplicate_hh_count']
+        self.rows_processed = state['rows_processed']
+
+    def match_chunk(self, client_cities, progress_callback=None, total=None):
+        """Сопоставляет порцию строк и возвращает список результатов"""
+        client_cities = list(client_cities)
+
+        # Уникальные нормализованные названия оцениваем одним пакетом до основного цикла
+        unique_cities = {
+            str(client_city).strip().lower()
+            for client_city in client_cities
+            if not pd.isna(client_city) and str(client_city).strip() != ""
+        }
+        unique_cities.difference_update(self.seen_original_cities)
+
+        stats = self.stats
+
+        # Сохранённые ручные исправления — одним запросом на порцию
+        corrected_matches = {}
+        if self.corrections is not None:
+            started = time.perf_counter()
+            corrected_matches = self.corrections.match_many(unique_cities, self.area_store)
+            unique_cities.difference_update(corrected_matches)
+            if stats is not None:
+                stats.hit('correction', len(corrected_matches))
+                stats.add_time('correction', time.perf_counter() - started)
+
+        # Ответы из постоянного кэша не пересчитываются
+        cached_matches = {}
+        if self.match_cache is not None:
+            started = time.perf_counter()
+            cached_matches = self.match_cache.get_many(unique_cities, self.threshold, self.area_store.match_version)
+            unique_cities.difference_update(cached_matches)
+            if stats is not None:
+                stats.hit('cache', len(cached_matches))
+                stats.add_time('cache', time.perf_counter() - started)
+
+        # Точные совпадения разрешаются по таблице, поиск кандидатов — только для остальных
+        exact_matches = {}
+        # Время точного поиска по строкам — для журнала медленных строк
+        exact_seconds = {}
+        for client_city in unique_cities:
+            started = time.perf_counter() if stats is not None else None
+            exact_match = match_exact(client_city, self.area_store, self.threshold, stats)
+            if exact_match:
+                exact_matches[client_city] = exact_match
+            if stats is not None:
+                exact_seconds[client_city] = time.perf_counter() - started
+        fuzzy_cities = unique_cities.difference(exact_matches)
+
+        started = time.perf_counter()
+        if self.processes:
+            batch_candidates = get_candidates_parallel(fuzzy_cities, self.candidate_index, self.processes)
+        else:
+            batch_candidates = get_candidates_batch(fuzzy_cities, self.candidate_index)
+        if stats is not None:
+            stats.add_time('exact', sum(exact_seconds.values()))
+            if fuzzy_cities:
+                stats.hit('word_candidates', len(fuzzy_cities))
+                stats.add_time('word_candidates', time.perf_counter() - started)
+
+        new_matches = {}
+        results = []
+        for client_city in client_cities:
+            idx = self.rows_processed
+            self.rows_processed += 1
+            started = time.perf_counter() if stats is not None else None
+            results.append(self._match_row(
+                idx, client_city, corrected_matches, cached_matches, exact_matches, batch_candidates, new_matches
+            ))
+            if stats is not None:
+                self._record_row(
+                    results[-1], time.perf_counter() - started, corrected_matches, cached_matches,
+                    exact_matches, exact_seconds
+                )
+
+            if progress_callback is not None:
+                progress_callback(self.rows_processed, total)
+
+        if self.match_cache is not None:
+            self.match_cache.put_many(new_matches, self.threshold, self.area_store.match_version)
+
+        return results
+
+    def _record_row(self, result, seconds, corrected_matches, cached_matches, exact_matches, exact_seconds):
+        """Исход строки в статистике; время строки — точный поиск плюс разбор в _match_row"""
+        status = result['Статус']
+        if status == '❌ Пустое значение':
+            self.stats.hit('empty')
+            return
+        if status == '🔄 Дубликат (исходное название)':
+            self.stats.hit('duplicate_original')
+            return
+        if status == '🔄 Дубликат (результат HH)':
+            self.stats.hit('duplicate_hh')
+
+        client_city = result['Исходное название']
+        client_city_normalized = client_city.lower()
+        if client_city_normalized in corrected_matches:
+            stage = 'correction'
+        elif client_city_normalized in cached_matches:
+            stage = 'cache'
+        elif client_city_normalized in exact_matches:
+            stage = 'exact'
+        else:
+            stage = 'fuzzy'
+        seconds += exact_seconds.get(client_city_normalized, 0.0)
+        self.stats.record_query(client_city, seconds, stage)
+
+    def _match_row(self, idx, client_city, corrected_matches, cached_matches, exact_matches, batch_candidates,
+                   new_matches):
+        if pd.isna(client_city) or str(client_city).strip() == "":
+            return {
+                'Исходное название': client_city,
+                'Итоговое гео': None,
+                'ID HH': None,
+                'Регион': None,
+                'Совпадение %': 0,
+                'Изменение': 'Нет',
+                'Статус': '❌ Пустое значение',
+                'row_id': idx
+            }
+
+        client_city_original = str(client_city).strip()
+        client_city_normalized = client_city_original.lower().strip()
+
+        if client_city_normalized in self.seen_original_cities:
+            self.duplicate_original_count += 1
+            original_result = self.seen_original_cities[client_city_normalized]
+            return {
+                'Исходное название': client_city_original,
+                'Итоговое гео': original_result['Итоговое гео'],
+                'ID HH': original_result['ID HH'],
+                'Регион': original_result['Регион'],
+                'Совпадение %': original_result['Совпадение %'],
+                'Изменение': original_result['Изменение'],
+                'Статус': '🔄 Дубликат (исходное название)',
+                'row_id': idx
+            }
+
+        cached_match = cached_matches.get(client_city_normalized)
+        corrected = client_city_normalized in corrected_matches
+        if corrected:
+            match_result = corrected_matches[client_city_normalized]
+            candidates = None
+        elif cached_match is not None:
+            match_result, candidates = cached_match
+        else:
+            if client_city_normalized in exact_matches:
+                match_result = exact_matches[client_city_normalized]
+                candidates = None
+            else:
+                match_result, candidates = smart_match_city(
+                    client_city_original, self.area_store, self.threshold,
+                    self.candidate_index, batch_candidates[client_city_normalized], self.stats,
+                    skip_exact=True
+                )
+
+        if self.keep_candidates:
+            # Сохраняются только уже посчитанные кандидаты строк для ручной проверки; точным
+            # совпадениям без кандидатов их досчитывает редактор, когда строка попадёт на страницу
+            needs_review = match_result is None or round(match_result[1], 1) <= REVIEW_MAX_SCORE
+            if candidates is not None and needs_review:
+                self.candidates[idx] = candidates
+
+        # В кэш пишем новые ответы и те, к которым теперь есть кандидаты; исправления живут отдельно
+        if not corrected and (cached_match is None or (cached_match[1] is None and candidates is not None)):
+            new_matches[client_city_normalized] = (match_result, candidates)
+
+        if match_result:
+            matched_id = match_result[0]
+            score = match_result[1]
+            hh_info = self.area_store.get(matched_id)
+
+            is_changed = check_if_changed(client_city_original, hh_info['name'])
+            change_status = 'Да' if is_changed else 'Нет'
+
+            # Дубликатом считаем повтор того же региона HH (по id), а не одноимённый город
+            if matched_id in self.seen_hh_cities:
+                self.duplicate_hh_count += 1
+                status = '🔄 Дубликат (результат HH)'
+            else:
+                status = '✅ Точное' if score >= 95 else '⚠️ Похожее'
+                self.seen_hh_cities[matched_id] = True
+
+            city_result = {
+                'Исходное название': client_city_original,
+                'Итоговое гео': hh_info['name'],
+                'ID HH': hh_info['id'],
+                'Регион': hh_info['parent'],
+                'Совпадение %': round(score, 1),
+                'Изменение': change_status,
+                'Статус': status,
+                'row_id': idx
+            }
+        else:
+            city_result = {
+                'Исходное название': client_city_original,
+                'Итоговое гео': None,
+                'ID HH': None,
+                'Регион': None,
+                'Совпадение %': 0,
+                'Изменение': 'Нет',
+                'Статус': CONFIRMED_NO_MATCH if corrected else '❌ Не найдено',
+                'row_id': idx
+            }
+
+        self.seen_original_cities[client_city_normalized] = city_result
+        return city_result
+
+
+def match_cities(client_cities, area_store, threshold=85, processes=None,
+                 progress_callback=None, candidate_index=None, stats=None, corrections=None):
+    """Сопоставляет города с сохранением кандидатов.
+
+    progress_callback(обработано, всего) вызывается после каждой строки,
+    stats (MatchStats) собирает попадания и время по этапам, corrections
+    (CorrectionStore) подставляет сохранённые ручные исправления.
+    Возвращает таблицу результатов, число дубликатов (по исходному
+    названию, по результату HH, всего) и кандидатов по row_id.
+    """
+    client_cities = list(client_cities)
+    matcher = CityMatcher(area_store, threshold, processes, candidate_index, stats=stats, corrections=corrections)
+    results = matcher.match_chunk(client_cities, progress_callback, len(client_cities))
+
+    return (
+        pd.DataFrame(results),
+        matcher.duplicate_original_count,
+        matcher.duplicate_hh_count,
+        matcher.total_duplicates,
+        matcher.candidates
+    )
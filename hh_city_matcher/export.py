@@ -0,0 +1,69 @@
+"""Файлы для скачивания: полный отчёт и файл для публикатора в XLSX или CSV"""
+import csv
+import hashlib
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+
+# Формат → (подпись, расширение, MIME-тип)
+EXPORT_FORMATS = {
+    'xlsx': ('Excel (.xlsx)', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV (.csv)', 'csv', 'text/csv'),
+}
+
+
+def frame_digest(df):
+    """Хэш содержимого таблицы (значения и порядок строк)"""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digest = hashlib.sha1(hashes.tobytes())
+    digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def selections_digest(selections):
+    """Хэш ручных правок {row_id: id HH или «Нет совпадения»}"""
+    items = sorted((int(row_id), str(value)) for row_id, value in selections.items())
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+def publisher_frame(final_result_df):
+    """Уникальные найденные города — содержимое файла для публикатора"""
+    unique_df = final_result_df[~final_result_df['Статус'].str.contains('Дубликат', na=False)]
+    return pd.DataFrame({'Итоговое гео': unique_df['Итоговое гео']}).dropna()
+
+
+def _rows(df):
+    # Пропуски пишутся пустыми ячейками, как в DataFrame.to_excel; замена — одной операцией по таблице
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def to_xlsx_bytes(df, sheet_name, header=True):
+    """XLSX через write-only книгу openpyxl: строки пишутся потоком, без модели ячеек в памяти"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    if header:
+        sheet.append(list(df.columns))
+    for row in _rows(df):
+        sheet.append(row)
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def to_csv_bytes(df, header=True):
+    """CSV в UTF-8 с BOM, чтобы Excel сразу открывал кириллицу"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    if header:
+        writer.writerow(df.columns)
+    writer.writerows(_rows(df))
+    return output.getvalue().encode('utf-8-sig')
+
+
+def to_bytes(df, fmt, sheet_name, header=True):
+    if fmt == 'csv':
+        return to_csv_bytes(df, header)
+    return to_xlsx_bytes(df, sheet_name, header)
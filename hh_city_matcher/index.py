@@ -0,0 +1,49 @@
+"""Общий для процесса индекс справочника HH: один экземпляр на версию снимка"""
+import threading
+
+from .aliases import AliasTable, alias_files_stamp, load_alias_rules
+from .areas import AreaStore
+from .matching import CandidateIndex
+
+
+class MatcherIndex:
+    """Справочник, таблица сокращений и индекс кандидатов одного снимка.
+
+    После построения не меняется, поэтому один экземпляр разделяют все
+    сессии и фоновые задания без блокировок.
+    """
+
+    def __init__(self, areas_tree, version=None, alias_rules=None):
+        self.version = version
+        # Время изменения файлов сокращений, из которых построена таблица (None — правила переданы явно)
+        self.aliases_stamp = None
+        if alias_rules is None:
+            self.aliases_stamp = alias_files_stamp()
+            alias_rules = load_alias_rules()
+        self.area_store = AreaStore(areas_tree, version)
+        self.area_store.aliases = AliasTable(self.area_store, alias_rules)
+        self.candidate_index = CandidateIndex(self.area_store)
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def get_matcher_index(areas_tree, version):
+    """Индекс снимка version: текущий, если не сменились версия и файлы сокращений, иначе новый.
+
+    Строится под блокировкой — одновременные сессии не строят его дважды;
+    подмена — одно присваивание, так что читатель видит либо старый индекс,
+    либо новый целиком. Кто уже держит старый, дорабатывает с ним.
+    """
+    global _current
+    stamp = alias_files_stamp()
+    index = _current
+    if index is not None and index.version == version and index.aliases_stamp == stamp:
+        return index
+    with _lock:
+        index = _current
+        if index is None or index.version != version or index.aliases_stamp != stamp:
+            index = MatcherIndex(areas_tree, version)
+            _current = index
+    return index
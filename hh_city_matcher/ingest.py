@@ -0,0 +1,94 @@
+"""Потоковое чтение первой колонки файлов с городами (CSV и XLSX)"""
+import pandas as pd
+from openpyxl import load_workbook
+
+# Сколько строк отдаётся сопоставлению за один шаг
+DEFAULT_CHUNK_SIZE = 5000
+
+# Размер блока при подсчёте строк CSV
+_COUNT_BLOCK_SIZE = 1 << 20
+
+
+def is_csv(filename):
+    return filename.lower().endswith('.csv')
+
+
+def iter_first_column(source, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Отдаёт значения первой колонки порциями, не загружая файл целиком.
+
+    source — путь или файловый объект (например, загруженный в Streamlit файл);
+    формат определяется по имени файла.
+    """
+    if is_csv(filename):
+        yield from _iter_csv(source, chunk_size)
+    else:
+        yield from _iter_xlsx(source, chunk_size)
+
+
+def _iter_csv(source, chunk_size):
+    # Только первая колонка и без выведения типов по порциям: значения остаются строками
+    reader = pd.read_csv(source, header=None, usecols=[0], dtype=str, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield chunk.iloc[:, 0].tolist()
+
+
+def _iter_xlsx(source, chunk_size):
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        chunk = []
+        # Пустые строки в конце листа не отдаём — как pd.read_excel
+        pending_empty = 0
+        for row in sheet.iter_rows(max_col=1, values_only=True):
+            value = row[0] if row else None
+            if value is None:
+                pending_empty += 1
+                continue
+
+            chunk.extend([None] * pending_empty)
+            pending_empty = 0
+            chunk.append(value)
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def estimate_row_count(source, filename):
+    """Быстро оценивает число строк для прогресса; None, если оценить нельзя"""
+    if is_csv(filename):
+        count = _count_csv_lines(source)
+    else:
+        workbook = load_workbook(source, read_only=True)
+        try:
+            # Берётся из размеров листа в заголовке, без разбора строк
+            count = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return count
+
+
+def _count_csv_lines(source):
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return _count_csv_lines(f)
+
+    count = 0
+    last_block = b''
+    while True:
+        block = source.read(_COUNT_BLOCK_SIZE)
+        if not block:
+            break
+        count += block.count(b'\n')
+        last_block = block
+    if last_block and not last_block.endswith(b'\n'):
+        count += 1
+    return count
@@ -0,0 +1,300 @@
+"""Фоновые задания сопоставления с контрольными точками на диске.
+
+Задание читает сохранённый входной файл порциями; после каждой порции её
+результаты и состояние CityMatcher записываются в каталог задания, поэтому
+прерванное задание (перезапуск страницы или сервера) продолжается с последней
+записанной порции, а не с начала.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import DATA_DIR
+from .engine import CityMatcher
+from .ingest import DEFAULT_CHUNK_SIZE, iter_first_column
+from .progress import ProgressReporter
+from .stats import MatchStats
+
+DEFAULT_JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
+
+# Сколько заданий выполняется одновременно; остальные ждут в очереди
+JOB_WORKERS = 2
+
+# Через сколько секунд каталоги старых заданий удаляются
+JOB_TTL = 7 * 24 * 3600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+# Есть контрольная точка, но задание сейчас не выполняется (например, после перезапуска сервера)
+INTERRUPTED = 'interrupted'
+
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+
+def job_id_for(data, threshold, version, collect_stats=False, corrections_revision=None):
+    """id задания: одинаковый файл с тем же порогом и справочником — то же задание"""
+    digest = hashlib.sha1(data)
+    digest.update(f"|{threshold}|{version}".encode('utf-8'))
+    # После новых ручных исправлений тот же файл сопоставляется заново, уже с ними
+    if corrections_revision:
+        digest.update(f"|corrections:{corrections_revision}".encode('utf-8'))
+    # Прогон со статистикой этапов — отдельное задание: готовый прогон без неё её не даст
+    if collect_stats:
+        digest.update(b'|stats')
+    return digest.hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_pickle(path):
+    # Контрольные точки пишет только само приложение в свой каталог данных
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class JobProgress(ProgressReporter):
+    """Прогресс задания: последнее состояние сохраняется в задании для опроса из интерфейса"""
+
+    def __init__(self, job, total=None):
+        super().__init__(total, min_interval=0.2)
+        self.job = job
+
+    def render(self, state):
+        self.job.progress = state
+
+
+class MatchJob:
+    """Задание сопоставления одного файла"""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.job_id = meta['job_id']
+        self.filename = meta['filename']
+        self.status = DONE if meta.get('finished') else INTERRUPTED
+        self.error = None
+        self.progress = None
+        self.rows_done = 0
+        self.status_counts = Counter()
+        self.stats = MatchStats() if meta.get('collect_stats') else None
+        self._cancel = threading.Event()
+
+    @property
+    def input_path(self):
+        return os.path.join(self.directory, 'input' + os.path.splitext(self.filename)[1].lower())
+
+    def _chunk_path(self, number):
+        return os.path.join(self.directory, f'chunk_{number:06d}.pkl')
+
+    def _state_path(self):
+        return os.path.join(self.directory, 'state.pkl')
+
+    def _load_state(self):
+        try:
+            return _read_pickle(self._state_path())
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _save_meta(self):
+        _write_atomic(
+            os.path.join(self.directory, 'meta.json'),
+            json.dumps(self.meta, ensure_ascii=False).encode('utf-8')
+        )
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self, area_store, match_cache=None, candidate_index=None, corrections=None):
+        """Выполняет задание, продолжая с последней контрольной точки"""
+        self.status = RUNNING
+        self._cancel.clear()
+        try:
+            self._run(area_store, match_cache, candidate_index, corrections)
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        else:
+            self.status = CANCELLED if self._cancel.is_set() else DONE
+
+    def _run(self, area_store, match_cache, candidate_index, corrections):
+        matcher = CityMatcher(
+            area_store, self.meta['threshold'], self.meta['processes'],
+            candidate_index=candidate_index, match_cache=match_cache, stats=self.stats,
+            corrections=corrections
+        )
+
+        chunks_done = 0
+        state = self._load_state()
+        if state is not None:
+            chunks_done = state['chunks_done']
+            matcher.set_state(state['matcher'])
+            self.status_counts = Counter(state['status_counts'])
+            if self.stats is not None:
+                self.stats = matcher.stats = state['stats']
+        self.rows_done = matcher.rows_processed
+
+        progress = JobProgress(self, self.meta.get('total'))
+        chunk_size = self.meta['chunk_size']
+        for number, chunk in enumerate(iter_first_column(self.input_path, self.filename, chunk_size)):
+            if number < chunks_done:
+                continue
+            if self._cancel.is_set():
+                return
+
+            first_row = matcher.rows_processed
+            results = matcher.match_chunk(chunk, progress)
+            # Кандидаты порции уходят в её файл, в памяти задания они не копятся
+            candidates = {
+                row_id: matcher.candidates.pop(row_id)
+                for row_id in range(first_row, matcher.rows_processed)
+                if row_id in matcher.candidates
+            }
+            self.status_counts.update(result['Статус'] for result in results)
+
+            # Сначала порция, потом состояние: при сбое между ними порция просто пересчитается
+            _write_atomic(self._chunk_path(number), pickle.dumps((results, candidates)))
+            _write_atomic(self._state_path(), pickle.dumps({
+                'chunks_done': number + 1,
+                'matcher': matcher.get_state(),
+                'status_counts': dict(self.status_counts),
+                'stats': self.stats,
+            }))
+            self.rows_done = matcher.rows_processed
+
+        progress.finish()
+        self.meta['finished'] = True
+        self._save_meta()
+
+    def load_results(self):
+        """Результаты, кандидаты по row_id, счётчики дубликатов и статистика этапов завершённого задания"""
+        state = self._load_state()
+        results = []
+        candidates = {}
+        for number in range(state['chunks_done']):
+            chunk_results, chunk_candidates = _read_pickle(self._chunk_path(number))
+            results.extend(chunk_results)
+            candidates.update(chunk_candidates)
+
+        matcher_state = state['matcher']
+        return {
+            'results': results,
+            'candidates': candidates,
+            'dup_original': matcher_state['duplicate_original_count'],
+            'dup_hh': matcher_state['duplicate_hh_count'],
+            'stats': state.get('stats'),
+        }
+
+
+class JobManager:
+    """Очередь фоновых заданий; задания переживают перезапуск страницы, а с диска — и сервера"""
+
+    def __init__(self, root=DEFAULT_JOBS_DIR, workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='match-job')
+        os.makedirs(root, exist_ok=True)
+        self.prune()
+
+    def submit(self, data, filename, area_store, threshold=85, processes=None,
+               match_cache=None, total=None, chunk_size=DEFAULT_CHUNK_SIZE, candidate_index=None,
+               collect_stats=False, corrections=None):
+        """Ставит файл в очередь; повторная отправка того же файла возвращает существующее задание.
+
+        corrections (CorrectionStore) читается по ходу задания, поэтому
+        исправления, сохранённые во время прогона, действуют на следующие порции.
+        """
+        corrections_revision = corrections.revision if corrections is not None else None
+        job_id = job_id_for(data, threshold, area_store.match_version, collect_stats, corrections_revision)
+        with self._lock:
+            job = self._jobs.get(job_id) or self._load(job_id)
+            if job is None:
+                directory = os.path.join(self.root, job_id)
+                os.makedirs(directory, exist_ok=True)
+                job = MatchJob(directory, {
+                    'job_id': job_id,
+                    'filename': filename,
+                    'threshold': threshold,
+                    'processes': processes,
+                    'version': area_store.match_version,
+                    'total': total,
+                    'chunk_size': chunk_size,
+                    'collect_stats': collect_stats,
+                    'corrections_revision': corrections_revision,
+                    'created_at': time.time(),
+                })
+                _write_atomic(job.input_path, data)
+                job._save_meta()
+            self._jobs[job_id] = job
+
+            if job.status in (INTERRUPTED, FAILED, CANCELLED):
+                self._start(job, area_store, match_cache, candidate_index, corrections)
+        return job
+
+    def get(self, job_id):
+        """Задание по id: из памяти или с диска (тогда оно DONE или INTERRUPTED)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._load(job_id)
+                if job is not None:
+                    self._jobs[job_id] = job
+            return job
+
+    def resume(self, job, area_store, match_cache=None, candidate_index=None, corrections=None):
+        """Продолжает прерванное задание; False, если справочник или таблица сокращений с тех пор сменились"""
+        if job.meta['version'] != area_store.match_version:
+            return False
+        with self._lock:
+            if job.status == INTERRUPTED:
+                self._start(job, area_store, match_cache, candidate_index, corrections)
+        return True
+
+    def _start(self, job, area_store, match_cache, candidate_index, corrections=None):
+        job.status = QUEUED
+        job.error = None
+        self._executor.submit(job.run, area_store, match_cache, candidate_index, corrections)
+
+    def _load(self, job_id):
+        # id приходит из адресной строки — принимаем только то, что могли выдать сами
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        directory = os.path.join(self.root, job_id)
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return MatchJob(directory, meta)
+
+    def prune(self):
+        """Удаляет каталоги заданий старше ttl"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(directory) < cutoff:
+                    shutil.rmtree(directory, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,244 @@
+"""Сопоставление названий городов клиента со справочником HH.ru"""
+import time
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from .normalize import extract_city_and_region, name_key, normalize_region_name
+
+
+def check_if_changed(original, matched):
+    """Проверяет, изменилось ли название города"""
+    if matched is None or matched == "❌ Нет совпадения":
+        return False
+
+    original_clean = original.strip()
+    matched_clean = matched.strip()
+
+    return original_clean != matched_clean
+
+
+class CandidateIndex:
+    """Инвертированный индекс n-грамм по названиям HH для быстрого поиска кандидатов"""
+
+    NGRAM_SIZE = 3
+
+    def __init__(self, area_store):
+        self.ids = area_store.ids
+        self.names = area_store.names
+        self.names_lower = [name.lower() for name in self.names]
+        self.postings = {}
+
+        # Для каждой подстроки длиной 1..NGRAM_SIZE храним номера названий, где она встречается
+        for position, name_lower in enumerate(self.names_lower):
+            grams = set()
+            for size in range(1, self.NGRAM_SIZE + 1):
+                for start in range(len(name_lower) - size + 1):
+                    grams.add(name_lower[start:start + size])
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+
+    def lookup(self, word):
+        """Возвращает номера названий, содержащих слово как подстроку (в исходном порядке)"""
+        if not word:
+            return range(len(self.names))
+
+        if len(word) <= self.NGRAM_SIZE:
+            return self.postings.get(word, [])
+
+        # Пересекаем списки n-грамм, начиная с самого короткого
+        grams = {word[start:start + self.NGRAM_SIZE] for start in range(len(word) - self.NGRAM_SIZE + 1)}
+        posting_lists = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+        if not posting_lists[0]:
+            return []
+
+        positions = set(posting_lists[0])
+        for posting in posting_lists[1:]:
+            positions.intersection_update(posting)
+            if not positions:
+                return []
+
+        # Пересечение n-грамм даёт надмножество — проверяем подстроку целиком
+        return [position for position in sorted(positions) if word in self.names_lower[position]]
+
+
+def get_candidates_by_word(client_city, candidate_index, limit=20):
+    """Получает кандидатов по совпадению начального слова"""
+    first_word = client_city.split()[0].lower().strip()
+    client_city_lower = client_city.lower()
+
+    candidates = []
+    for position in candidate_index.lookup(first_word):
+        score = fuzz.WRatio(client_city_lower, candidate_index.names_lower[position])
+        candidates.append((candidate_index.ids[position], score))
+
+    candidates.sort(key=lambda x: x[1], reverse=True)
+
+    return candidates[:limit]
+
+
+# Минимальный размер матрицы оценок, при котором cdist считается во всех потоках
+BATCH_PARALLEL_MIN_CELLS = 20000
+
+
+def group_by_first_word(client_cities):
+    """Группирует города по первому слову: у группы общий набор кандидатов"""
+    groups = {}
+    for client_city in client_cities:
+        first_word = client_city.split()[0].lower().strip()
+        groups.setdefault(first_word, []).append(client_city)
+    return groups
+
+
+def get_candidates_batch(client_cities, candidate_index, limit=20, workers=-1):
+    """Пакетно получает кандидатов для набора городов через process.cdist"""
+    # Города с одинаковым первым словом делят один набор кандидатов — считаем их одной матрицей
+    groups = group_by_first_word(client_cities)
+
+    results = {}
+    for first_word, group in groups.items():
+        positions = candidate_index.lookup(first_word)
+        if not len(positions):
+            for client_city in group:
+                results[client_city] = []
+            continue
+
+        choices = [candidate_index.names_lower[position] for position in positions]
+        scores = process.cdist(
+            [client_city.lower() for client_city in group],
+            choices,
+            scorer=fuzz.WRatio,
+            dtype=np.float64,
+            # На маленьких матрицах запуск потоков дороже самого расчёта
+            workers=workers if len(group) * len(choices) >= BATCH_PARALLEL_MIN_CELLS else 1
+        )
+
+        for client_city, row in zip(group, scores):
+            # Стабильная сортировка сохраняет порядок справочника при равных оценках
+            top = np.argsort(-row, kind='stable')[:limit]
+            results[client_city] = [
+                (candidate_index.ids[positions[i]], float(row[i])) for i in top
+            ]
+
+    return results
+
+
+def _lookup_name(client_city, area_store):
+    """Позиция по полному названию или сокращению и этап («name» или «alias»)"""
+    position = area_store.keys.by_name.get(name_key(client_city))
+    if position is not None:
+        return position, 'name'
+    if area_store.aliases is not None:
+        position = area_store.aliases.lookup(client_city)
+        if position is not None:
+            return position, 'alias'
+    return None, None
+
+
+def match_exact(client_city, area_store, threshold=85, stats=None):
+    """Точное совпадение названия (с учётом региона, если он указан).
+
+    Возвращает (id, оценка, 0) или None. Сначала полное название или
+    сокращение (area_store.aliases) ищется в хэше и при совпадении сразу
+    возвращается с оценкой 100; иначе кандидаты берутся из таблицы базовых
+    названий. Совпадение базового названия принимается, только если оценка
+    не ниже threshold, а указанный в строке регион совпал: иначе строку
+    разбирает нечёткий поиск. Все таблицы готовы заранее, поэтому поиск не
+    зависит от размера справочника. stats (MatchStats) считает попадания
+    «name», «alias», «exact» и «exact_region».
+    """
+    position, stage = _lookup_name(client_city, area_store)
+    if position is None and area_store.aliases is not None:
+        # Префикс «г.», «пгт» снимаем и ищем ещё раз; базовое название дальше ищется уже без него
+        stripped = area_store.aliases.strip_prefix(client_city)
+        if stripped != client_city.strip():
+            client_city = stripped
+            position, stage = _lookup_name(client_city, area_store)
+    if position is not None:
+        if stats is not None:
+            stats.hit(stage)
+        return (area_store.ids[position], 100.0, 0)
+
+    city_part, region_part = extract_city_and_region(client_city)
+    positions = area_store.keys.by_base.get(name_key(city_part))
+    if not positions:
+        return None
+
+    stage = 'exact'
+    if region_part:
+        # Регион из строки сверяется с регионом первого уровня по позиции, а не по подстроке родителя;
+        # одноимённый город из другого региона точным совпадением не считается
+        region_normalized = normalize_region_name(region_part)
+        region_positions = area_store.find_regions(region_normalized)
+        positions = [
+            p for p in positions
+            if area_store.regions[p] in region_positions or region_normalized in area_store.keys.region_keys[p]
+        ]
+        if not positions:
+            return None
+        stage = 'exact_region'
+
+    # Из одноимённых берём самое похожее на исходную строку, при равенстве — первое в справочнике;
+    # ё и е сравниваются как одна буква, как и при поиске в таблицах
+    client_city_key = name_key(client_city)
+    best_position, best_score = None, -1
+    for position in positions:
+        score = fuzz.WRatio(client_city_key, name_key(area_store.names[position]))
+        if score > best_score:
+            best_position, best_score = position, score
+
+    if best_score < threshold:
+        return None
+    if stats is not None:
+        stats.hit(stage)
+    return (area_store.ids[best_position], best_score, 0)
+
+
+def smart_match_city(client_city, area_store, threshold=85, candidate_index=None, word_candidates=None,
+                     stats=None, corrections=None, skip_exact=False):
+    """Умное сопоставление города с сохранением кандидатов.
+
+    Сохранённое ручное исправление (corrections — словарь из
+    CorrectionStore.load, поиск по name_key) и точные совпадения находятся
+    сразу и возвращаются без кандидатов (None); поиск по словам запускается
+    только для остальных строк. skip_exact — точный этап уже пройден
+    вызывающим (как в CityMatcher) и не повторяется. С stats (MatchStats)
+    считаются попадания и время каждого пройденного этапа.
+    """
+
+    if corrections is not None:
+        key = name_key(client_city)
+        if key in corrections:
+            if stats is not None:
+                stats.hit('correction')
+            return corrections[key], word_candidates
+
+    if not skip_exact:
+        started = time.perf_counter() if stats is not None else None
+        exact_match = match_exact(client_city, area_store, threshold, stats)
+        if stats is not None:
+            stats.add_time('exact', time.perf_counter() - started)
+        if exact_match:
+            return exact_match, word_candidates
+
+    # Кандидаты могут быть посчитаны заранее пакетно (см. match_cities)
+    if word_candidates is None:
+        # Индекс строится один раз на список городов; при одиночном вызове строим его на месте
+        if candidate_index is None:
+            candidate_index = CandidateIndex(area_store)
+        started = time.perf_counter() if stats is not None else None
+        word_candidates = get_candidates_by_word(client_city, candidate_index)
+        if stats is not None:
+            stats.hit('word_candidates')
+            stats.add_time('word_candidates', time.perf_counter() - started)
+
+    # Лучший кандидат по словам — ответ, если он не ниже порога; иначе совпадения нет
+    if word_candidates and word_candidates[0][1] >= threshold:
+        if stats is not None:
+            stats.hit('word_match')
+        best_candidate = word_candidates[0]
+        return (best_candidate[0], best_candidate[1], 0), word_candidates
+
+    if stats is not None:
+        stats.hit('no_match')
+    return None, word_candidates
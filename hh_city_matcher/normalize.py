@@ -0,0 +1,100 @@
+"""Нормализация названий городов и регионов.
+
+Для названий из справочника ключи считаются один раз при загрузке (AreaKeys),
+для входных строк — мемоизируются в ограниченном LRU-кэше.
+"""
+from functools import lru_cache
+
+# Сколько разных входных строк помнит каждый мемоизированный нормализатор
+NORMALIZE_CACHE_SIZE = 65536
+
+REGION_NAME_REPLACEMENTS = (
+    ('ленинградская', 'ленинград'),
+    ('московская', 'москов'),
+    ('курская', 'курск'),
+    ('кемеровская', 'кемеров'),
+    ('свердловская', 'свердлов'),
+    ('нижегородская', 'нижегород'),
+    ('новосибирская', 'новосибирск'),
+    ('тамбовская', 'тамбов'),
+    ('красноярская', 'красноярск'),
+    ('область', ''),
+    ('обл', ''),
+    ('край', ''),
+    ('республика', ''),
+    ('респ', ''),
+    ('  ', ' ')
+)
+
+# Признаки того, что слово во входной строке относится к региону
+REGION_WORD_KEYWORDS = (
+    'област', 'край', 'республик', 'округ',
+    'ленинград', 'москов', 'курск', 'кемеров',
+    'свердлов', 'нижегород', 'новосибирск', 'тамбов',
+    'красноярск'
+)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_region_name(text):
+    """Нормализует название региона для сравнения"""
+    text = text.lower()
+    for old, new in REGION_NAME_REPLACEMENTS:
+        text = text.replace(old, new)
+    return text.strip()
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def extract_city_and_region(text):
+    """Извлекает название города и региона из текста"""
+    words = text.split()
+
+    if len(words) == 1:
+        return text, None
+
+    city_words = []
+    region_words = []
+    region_found = False
+
+    for word in words:
+        if not region_found and any(keyword in word.lower() for keyword in REGION_WORD_KEYWORDS):
+            region_found = True
+            region_words.append(word)
+        elif region_found:
+            region_words.append(word)
+        else:
+            city_words.append(word)
+
+    city = ' '.join(city_words) if city_words else text
+    region = ' '.join(region_words) if region_words else None
+
+    return city, region
+
+
+def city_base_name(name):
+    """Название без уточнения в скобках, в нижнем регистре"""
+    return name.split('(')[0].strip().lower()
+
+
+def name_key(text):
+    """Ключ полного названия для точного поиска: нижний регистр, ё → е, одиночные пробелы"""
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+class AreaKeys:
+    """Нормализованные ключи названий справочника, по позициям AreaStore"""
+
+    def __init__(self, names):
+        self.base_names = [city_base_name(name) for name in names]
+        # Названия справочника нормализуем без LRU, чтобы не вытеснять из него входные строки
+        self.region_keys = [normalize_region_name.__wrapped__(name) for name in names]
+
+        # Ключ базового названия (как у name_key) → позиции в порядке справочника, для точного поиска за O(1)
+        self.by_base = {}
+        for position, base_name in enumerate(self.base_names):
+            self.by_base.setdefault(name_key(base_name), []).append(position)
+
+        # Полное название → первая позиция в справочнике (из одноимённых выбирается первая)
+        self.by_name = {}
+        for position, name in enumerate(names):
+            self.by_name.setdefault(name_key(name), position)
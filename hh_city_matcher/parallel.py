@@ -0,0 +1,77 @@
+"""Параллельный расчёт кандидатов для больших файлов на пуле процессов"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .matching import get_candidates_batch, group_by_first_word
+
+# Меньше этого числа уникальных городов запуск пула не окупается
+PARALLEL_MIN_CITIES = 2000
+
+# Сколько шардов приходится на один процесс (для выравнивания нагрузки)
+SHARDS_PER_PROCESS = 4
+
+# Индекс кандидатов внутри процесса-воркера
+_worker_index = None
+
+
+def _init_worker(candidate_index):
+    global _worker_index
+    _worker_index = candidate_index
+
+
+def _score_shard(client_cities):
+    # Параллелим процессами, поэтому внутри воркера cdist считает в один поток
+    return get_candidates_batch(client_cities, _worker_index, workers=1)
+
+
+def _get_context():
+    # fork отдаёт воркерам индекс из памяти родителя без сериализации, но безопасен
+    # только в главном потоке однопоточного процесса (CLI): под Streamlit и в потоке
+    # фонового задания форк может унести чужие захваченные блокировки и зависнуть.
+    # Там пул стартует через forkserver, и индекс один раз передаётся каждому воркеру
+    start_methods = multiprocessing.get_all_start_methods()
+    if threading.current_thread() is threading.main_thread() and threading.active_count() == 1:
+        if 'fork' in start_methods:
+            return multiprocessing.get_context('fork')
+    if 'forkserver' in start_methods:
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def split_into_shards(client_cities, shard_count):
+    """Делит города на шарды, не разрывая группы с общим первым словом"""
+    shards = [[] for _ in range(shard_count)]
+    # Жадно кладём самые большие группы в наименее загруженный шард
+    groups = sorted(group_by_first_word(client_cities).values(), key=len, reverse=True)
+    for group in groups:
+        min(shards, key=len).extend(group)
+    return [shard for shard in shards if shard]
+
+
+def get_candidates_parallel(client_cities, candidate_index, processes=None):
+    """Считает кандидатов для уникальных городов на пуле процессов.
+
+    Возвращает тот же словарь город → кандидаты, что и get_candidates_batch,
+    поэтому порядок строк и обработка дубликатов остаются в match_cities.
+    """
+    client_cities = list(client_cities)
+    processes = processes or os.cpu_count() or 1
+
+    if processes <= 1 or len(client_cities) < PARALLEL_MIN_CITIES:
+        return get_candidates_batch(client_cities, candidate_index)
+
+    shards = split_into_shards(client_cities, processes * SHARDS_PER_PROCESS)
+
+    results = {}
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=_get_context(),
+        initializer=_init_worker,
+        initargs=(candidate_index,)
+    ) as executor:
+        for shard_result in executor.map(_score_shard, shards):
+            results.update(shard_result)
+
+    return results
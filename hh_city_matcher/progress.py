@@ -0,0 +1,127 @@
+"""Прогресс сопоставления с ограничением частоты обновлений.
+
+Движок сообщает о каждой строке, а приёмник (Streamlit, консоль или ничего)
+перерисовывается не чаще заданного интервала или шага в процентах.
+"""
+import sys
+import time
+from collections import namedtuple
+
+# Не чаще одного обновления за столько секунд...
+DEFAULT_MIN_INTERVAL = 0.5
+# ...если только с прошлого обновления не пройдено столько долей от общего числа строк
+DEFAULT_MIN_STEP = 0.05
+
+ProgressState = namedtuple('ProgressState', 'done total fraction rate eta elapsed')
+
+
+def format_duration(seconds):
+    """Длительность в виде 1:05 или 1:02:03"""
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def describe_progress(state):
+    """Строка вида «Обработано 500 из 1000 городов · 250 строк/с · осталось 0:02»"""
+    if state.total:
+        text = f"Обработано {state.done} из {state.total} городов"
+    else:
+        text = f"Обработано {state.done} городов"
+    if state.rate:
+        text += f" · {state.rate:.0f} строк/с"
+    if state.eta is not None:
+        text += f" · осталось {format_duration(state.eta)}"
+    return text
+
+
+class ProgressReporter:
+    """Принимает progress(обработано, всего) на каждой строке и вызывает render() с ограничением частоты.
+
+    Сам по себе ничего не выводит — приёмники переопределяют render().
+    """
+
+    def __init__(self, total=None, min_interval=DEFAULT_MIN_INTERVAL, min_step=DEFAULT_MIN_STEP):
+        self.total = total
+        self.min_interval = min_interval
+        self.min_step = min_step
+        self.started = time.perf_counter()
+        self._last_time = None
+        self._last_done = 0
+        self._done = None
+        self.state = None
+
+    def __call__(self, done, total=None):
+        self.update(done, total)
+
+    def update(self, done, total=None):
+        if total is not None:
+            self.total = total
+        self._done = done
+        now = time.perf_counter()
+
+        if self._last_time is not None and done != self.total:
+            due_by_time = now - self._last_time >= self.min_interval
+            due_by_step = bool(self.total) and (done - self._last_done) >= self.min_step * self.total
+            if not (due_by_time or due_by_step):
+                return
+
+        self._last_time = now
+        self._last_done = done
+        self.state = self._make_state(done, now)
+        self.render(self.state)
+
+    def finish(self, complete=True):
+        """Завершение прогона: последнее состояние рисуется всегда, затем приёмник убирает индикатор.
+
+        Оценка общего числа строк может оказаться больше фактического — при
+        complete обработанное и есть всё, и индикатор доходит до 100%. Прерванный
+        прогон (complete=False) показывает долю от прежней оценки.
+        """
+        if self._done is not None:
+            if complete:
+                self.total = self._done
+            self.state = self._make_state(self._done, time.perf_counter())
+            self.render(self.state)
+        self.close(self.state)
+
+    def _make_state(self, done, now):
+        elapsed = now - self.started
+        # Оценка числа строк может оказаться меньше фактического
+        total = max(self.total, done) if self.total else None
+        rate = done / elapsed if elapsed > 0 else None
+        eta = (total - done) / rate if total and rate else None
+        fraction = done / total if total else None
+        return ProgressState(done, total, fraction, rate, eta, elapsed)
+
+    def render(self, state):
+        pass
+
+    def close(self, state):
+        pass
+
+
+class ConsoleProgress(ProgressReporter):
+    """Прогресс одной обновляемой строкой в stderr (для CLI)"""
+
+    def __init__(self, total=None, stream=None, **kwargs):
+        super().__init__(total, **kwargs)
+        self.stream = stream or sys.stderr
+        self._width = 0
+
+    def render(self, state):
+        text = describe_progress(state)
+        if state.fraction is not None:
+            text = f"{state.fraction:6.1%} {text}"
+        # Затираем хвост предыдущей, более длинной строки
+        self.stream.write('\r' + text.ljust(self._width))
+        self.stream.flush()
+        self._width = len(text)
+
+    def close(self, state):
+        if self._width:
+            self.stream.write('\n')
+            self.stream.flush()
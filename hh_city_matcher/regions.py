@@ -0,0 +1,91 @@
+"""Списки городов России по регионам, построенные один раз по справочнику"""
+import numpy as np
+import pandas as pd
+
+from .areas import RUSSIA_ID
+
+# Что не выгружать (нормализованные названия в нижнем регистре)
+EXCLUDED_NAMES = frozenset({
+    'россия', 'другие регионы', 'другие страны',
+    'чукотский ао', 'ямало-ненецкий ао', 'ненецкий ао',
+    'ханты-мансийский ао - югра', 'еврейская ао',
+    'беловское', 'горькая балка'
+})
+
+# Ключевые слова, которые указывают на регион, а не город
+TOP_LEVEL_REGION_KEYWORDS = ('область', 'край', 'республика', 'округ', 'автономн')
+
+CITY_COLUMNS = ['Город', 'ID HH', 'Регион']
+
+
+def _is_city(name, parent):
+    """Город ли это: не исключение и не регион верхнего уровня"""
+    name_normalized = name.lower().strip()
+    if name_normalized in EXCLUDED_NAMES:
+        return False
+
+    if not parent or parent == 'Россия':
+        if any(keyword in name_normalized for keyword in TOP_LEVEL_REGION_KEYWORDS):
+            return False
+        # Автономные округа («… АО») — не города
+        if name.endswith('АО'):
+            return False
+
+    return True
+
+
+def _dedup_key(name):
+    """Ключ дедупликации: нижний регистр, без лишних пробелов"""
+    return ' '.join(name.lower().split())
+
+
+class CityDirectory:
+    """Города России из справочника HH в порядке справочника.
+
+    Отбор (исключения, регионы верхнего уровня) выполняется один раз; выборка
+    по регионам — проверка id региона первого уровня по множеству выбранных
+    (см. DistrictMap) и склейка уже готовых колонок.
+    """
+
+    def __init__(self, area_store):
+        self.version = area_store.version
+        cities = []
+        ids = []
+        regions = []
+        region_ids = []
+        for area_id in area_store.ids:
+            if area_store.root_id(area_id) != RUSSIA_ID:
+                continue
+            name = area_store.name(area_id)
+            parent = area_store.parent_name(area_id)
+            if not _is_city(name, parent):
+                continue
+
+            cities.append(name)
+            ids.append(str(area_id))
+            regions.append(parent if parent else 'Россия')
+            region_ids.append(area_store.region_id(area_id) or -1)
+
+        self.table = pd.DataFrame({'Город': cities, 'ID HH': ids, 'Регион': regions}, columns=CITY_COLUMNS)
+        self.region_ids = np.asarray(region_ids, dtype=np.int64)
+        self._dedup_codes = pd.factorize(pd.Series([_dedup_key(name) for name in cities], dtype=object))[0]
+
+    def __len__(self):
+        return len(self.table)
+
+    def _select(self, positions):
+        """Строки по позициям в порядке справочника, без повторов названий"""
+        positions = np.unique(np.asarray(positions, dtype=np.intp))
+        # Первое вхождение каждого названия в выборке
+        _, first = np.unique(self._dedup_codes[positions], return_index=True)
+        positions = positions[np.sort(first)]
+        return self.table.iloc[positions].reset_index(drop=True)
+
+    def all_cities(self):
+        """Все города России без повторов названий"""
+        return self._select(np.arange(len(self.table)))
+
+    def cities_in_regions(self, region_ids):
+        """Города выбранных регионов первого уровня (по id) без повторов названий"""
+        selected = np.isin(self.region_ids, np.asarray(list(region_ids), dtype=np.int64))
+        return self._select(np.flatnonzero(selected))
@@ -0,0 +1,114 @@
+"""Представление таблицы результатов: порядок показа, поиск и ручные правки"""
+import numpy as np
+import pandas as pd
+
+from .matching import check_if_changed
+
+# Вариант редактора «совпадения нет»
+NO_MATCH = "❌ Нет совпадения"
+
+# Что записывается в строку, отмеченную как «Нет совпадения»
+_NO_MATCH_VALUES = {
+    'Итоговое гео': None,
+    'ID HH': None,
+    'Регион': None,
+    'Совпадение %': 0,
+    'Изменение': 'Нет',
+    'Статус': '❌ Не найдено',
+}
+
+# Колонки, по которым ищет строка «🔍 Поиск по таблице»
+SEARCH_COLUMNS = ['Исходное название', 'Итоговое гео', 'Регион', 'Статус']
+
+# Разделитель полей в поисковой колонке; в однострочный запрос он попасть не может
+_SEARCH_SEPARATOR = '\n'
+
+
+def sort_priority(result_df):
+    """0 — не найдено, 1 — название изменено, 2 — остальные"""
+    return np.select(
+        [result_df['Совпадение %'] == 0, result_df['Изменение'] == 'Да'],
+        [0, 1],
+        default=2
+    )
+
+
+def search_key(result_df):
+    """Поля для поиска в нижнем регистре, склеенные в одну строку на запись"""
+    fields = [
+        result_df[column].fillna('').astype(str).str.lower()
+        for column in SEARCH_COLUMNS
+    ]
+    key = fields[0]
+    for field in fields[1:]:
+        key = key + _SEARCH_SEPARATOR + field
+    return key
+
+
+def build_results_view(result_df):
+    """Отсортированная для показа копия результатов с приоритетом и поисковой колонкой.
+
+    Строится один раз после сопоставления, а не на каждый перезапуск страницы.
+    """
+    view = result_df.assign(sort_priority=sort_priority(result_df))
+    view = view.sort_values(
+        by=['sort_priority', 'Совпадение %'],
+        ascending=[True, True]
+    ).reset_index(drop=True)
+    view['_search'] = search_key(view)
+    return view
+
+
+def search_results(view, query):
+    """Строки представления, в любом из полей которых встречается запрос"""
+    query = query.lower().strip()
+    if not query:
+        return view
+    return view[view['_search'].str.contains(query, regex=False)]
+
+
+def apply_manual_selections(result_df, selections, area_store):
+    """Итоговая таблица с ручными правками {row_id: id HH или NO_MATCH}.
+
+    Строки находятся по индексу row_id, а значения записываются по колонкам
+    одним присваиванием на группу, а не маской на каждую правку.
+    """
+    final_result_df = result_df.copy()
+    if not selections:
+        return final_result_df
+
+    row_ids = list(selections)
+    positions = pd.Index(final_result_df['row_id']).get_indexer(row_ids)
+
+    cleared = []
+    chosen = []
+    chosen_ids = []
+    for position, row_id in zip(positions, row_ids):
+        if position < 0:
+            continue
+        value = selections[row_id]
+        if value == NO_MATCH:
+            cleared.append(position)
+        else:
+            chosen.append(position)
+            chosen_ids.append(value)
+
+    if cleared:
+        for column, value in _NO_MATCH_VALUES.items():
+            final_result_df.iloc[cleared, final_result_df.columns.get_loc(column)] = value
+
+    if chosen:
+        hh_infos = [area_store.get(area_id) for area_id in chosen_ids]
+        names = [hh_info['name'] for hh_info in hh_infos]
+        originals = final_result_df['Исходное название'].to_numpy()[chosen]
+        changes = ['Да' if check_if_changed(original, name) else 'Нет' for original, name in zip(originals, names)]
+
+        for column, values in (
+            ('Итоговое гео', names),
+            ('ID HH', [hh_info['id'] for hh_info in hh_infos]),
+            ('Регион', [hh_info['parent'] for hh_info in hh_infos]),
+            ('Изменение', changes),
+        ):
+            final_result_df.iloc[chosen, final_result_df.columns.get_loc(column)] = values
+
+    return final_result_df
@@ -0,0 +1,185 @@
+"""Локальный снимок справочника HH.ru с условной перепроверкой через API"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from .config import DATA_DIR, HH_AREAS_URL
+
+# Версия формата файла снимка; при изменении структуры старые файлы игнорируются
+SNAPSHOT_FORMAT = 1
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(DATA_DIR, 'hh_areas.json.gz')
+
+# Таймауты запроса к API: (подключение, чтение)
+REQUEST_TIMEOUT = (5, 30)
+
+# Как часто сверять снимок с API (в секундах)
+REVALIDATE_INTERVAL = 3600
+
+
+class AreasSnapshot:
+    """Снимок справочника: дерево регионов и заголовки для условных запросов"""
+
+    def __init__(self, areas, version, etag=None, last_modified=None, fetched_at=None):
+        self.areas = areas
+        self.version = version
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        # Время последней успешной сверки с API (для снимка с диска — mtime файла)
+        self.checked_at = self.fetched_at
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """Читает снимок с диска; возвращает None, если файла нет или он повреждён"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            payload = json.load(f)
+        checked_at = os.path.getmtime(path)
+    except (OSError, EOFError, ValueError):
+        return None
+
+    if payload.get('format') != SNAPSHOT_FORMAT:
+        return None
+
+    snapshot = AreasSnapshot(
+        payload['areas'],
+        payload['version'],
+        etag=payload.get('etag'),
+        last_modified=payload.get('last_modified'),
+        fetched_at=payload.get('fetched_at')
+    )
+    snapshot.checked_at = checked_at
+    return snapshot
+
+
+def save_snapshot(snapshot, path=DEFAULT_SNAPSHOT_PATH):
+    """Атомарно записывает снимок на диск (через временный файл и rename)"""
+    payload = {
+        'format': SNAPSHOT_FORMAT,
+        'version': snapshot.version,
+        'etag': snapshot.etag,
+        'last_modified': snapshot.last_modified,
+        'fetched_at': snapshot.fetched_at,
+        'areas': snapshot.areas
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def fetch_areas(url=HH_AREAS_URL, snapshot=None, timeout=REQUEST_TIMEOUT):
+    """Загружает справочник из API; возвращает None, если снимок не изменился (304)"""
+    headers = {}
+    if snapshot is not None:
+        if snapshot.etag:
+            headers['If-None-Match'] = snapshot.etag
+        if snapshot.last_modified:
+            headers['If-Modified-Since'] = snapshot.last_modified
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    return AreasSnapshot(
+        response.json(),
+        hashlib.sha256(response.content).hexdigest()[:16],
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified')
+    )
+
+
+class AreasProvider:
+    """Отдаёт справочник из локального снимка и обновляет его в фоне"""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH, url=HH_AREAS_URL,
+                 revalidate_interval=REVALIDATE_INTERVAL, timeout=REQUEST_TIMEOUT):
+        self.path = path
+        self.url = url
+        self.revalidate_interval = revalidate_interval
+        self.timeout = timeout
+        self.last_error = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def get(self, background=True):
+        """Возвращает актуальный снимок; устаревший сверяет с API в фоне или сразу"""
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = load_snapshot(self.path)
+
+        # Снимка нет ни в памяти, ни на диске — без загрузки работать не с чем
+        if self._snapshot is None:
+            self.refresh()
+            if self._snapshot is None:
+                raise self.last_error
+
+        if time.time() - self._snapshot.checked_at >= self.revalidate_interval:
+            if background:
+                self.refresh_in_background()
+            else:
+                self.refresh()
+
+        return self._snapshot
+
+    def refresh(self):
+        """Сверяет снимок с API; при недоступности API оставляет текущий снимок"""
+        current = self._snapshot
+        try:
+            fresh = fetch_areas(self.url, current, self.timeout)
+        except (requests.RequestException, ValueError) as e:
+            self.last_error = e
+            if current is not None:
+                # Не долбим недоступный API на каждом запросе — следующая попытка через интервал
+                current.checked_at = time.time()
+            return current
+
+        self.last_error = None
+        if fresh is None:
+            current.checked_at = time.time()
+            self._touch()
+            return current
+
+        if current is not None and fresh.version == current.version:
+            # Сервер не поддержал условный запрос, но данные те же — оставляем прежний объект
+            current.etag, current.last_modified = fresh.etag, fresh.last_modified
+            fresh = current
+
+        fresh.checked_at = time.time()
+        try:
+            save_snapshot(fresh, self.path)
+        except OSError as e:
+            self.last_error = e
+        self._snapshot = fresh
+        return fresh
+
+    def refresh_in_background(self):
+        """Запускает сверку в фоновом потоке, если она ещё не идёт"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, daemon=True)
+            self._refresh_thread.start()
+
+    def _touch(self):
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
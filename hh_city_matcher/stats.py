@@ -0,0 +1,85 @@
+"""Статистика сопоставления по этапам: попадания, время и самые медленные строки.
+
+Собирается, только если в CityMatcher передан MatchStats; без него движок
+не замеряет ничего.
+"""
+import heapq
+import json
+from collections import Counter
+
+# Сколько самых медленных строк хранить
+SLOW_QUERY_LIMIT = 20
+
+# Этапы в порядке прохождения строки, с подписями для отчёта
+STAGES = {
+    'empty': 'Пустые строки',
+    'duplicate_original': 'Дубликат исходного названия',
+    'correction': 'Сохранённое ручное исправление',
+    'cache': 'Кэш сопоставлений',
+    'name': 'Точное по полному названию',
+    'alias': 'Сокращение или неофициальное название',
+    'exact': 'Точное по базовому названию',
+    'exact_region': 'Точное с учётом региона',
+    'word_candidates': 'Кандидаты по первому слову',
+    'word_match': 'Лучший кандидат выше порога',
+    'no_match': 'Не найдено',
+    'duplicate_hh': 'Дубликат результата HH',
+}
+
+
+class MatchStats:
+    """Попадания и суммарное время по этапам плюс top-N самых медленных строк"""
+
+    def __init__(self, slow_limit=SLOW_QUERY_LIMIT):
+        self.slow_limit = slow_limit
+        self.hits = Counter()
+        self.seconds = Counter()
+        self.rows = 0
+        # Куча (время, строка, этап) — в вершине самая быстрая из сохранённых
+        self._slow = []
+
+    def hit(self, stage, count=1):
+        self.hits[stage] += count
+
+    def add_time(self, stage, seconds):
+        self.seconds[stage] += seconds
+
+    def record_query(self, text, seconds, stage):
+        """Время одной строки; в журнал попадают только slow_limit самых медленных"""
+        self.rows += 1
+        entry = (seconds, text, stage)
+        if len(self._slow) < self.slow_limit:
+            heapq.heappush(self._slow, entry)
+        elif seconds > self._slow[0][0]:
+            heapq.heapreplace(self._slow, entry)
+
+    def slow_queries(self):
+        """[(время, строка, этап)] от самой медленной"""
+        return sorted(self._slow, reverse=True)
+
+    def stage_rows(self):
+        """Строки отчёта по этапам: (этап, подпись, попадания, время, мс на попадание)"""
+        rows = []
+        for stage, label in STAGES.items():
+            hits = self.hits.get(stage, 0)
+            seconds = self.seconds.get(stage, 0.0)
+            if not hits and not seconds:
+                continue
+            rows.append((stage, label, hits, seconds, seconds * 1000 / hits if hits else None))
+        return rows
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'stages': {
+                stage: {'hits': hits, 'seconds': seconds}
+                for stage, _, hits, seconds, _ in self.stage_rows()
+            },
+            'slow_queries': [
+                {'input': text, 'stage': stage, 'seconds': seconds}
+                for seconds, text, stage in self.slow_queries()
+            ],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
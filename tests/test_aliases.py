@@ -0,0 +1,57 @@
+"""Снятие префиксов «г.», «пгт» перед точным поиском"""
+import pytest
+
+from hh_city_matcher.aliases import DEFAULT_ALIASES_PATH, AliasTable, load_alias_rules
+from hh_city_matcher.areas import AreaStore
+from hh_city_matcher.matching import match_exact
+
+
+def area(area_id, name, children=()):
+    return {'id': str(area_id), 'name': name, 'areas': list(children)}
+
+
+AREAS_TREE = [
+    area(113, 'Россия', [
+        area(1, 'Москва'),
+        area(1007, 'Белгородская область', [area(1008, 'Старый Оскол'), area(1009, 'Оскол')]),
+        area(1438, 'Ростовская область', [area(1439, 'Вёшенская')]),
+    ]),
+]
+
+
+@pytest.fixture(scope='module')
+def area_store():
+    area_store = AreaStore(AREAS_TREE)
+    # Только встроенная таблица, без файла пользователя
+    area_store.aliases = AliasTable(area_store, load_alias_rules([DEFAULT_ALIASES_PATH]))
+    return area_store
+
+
+@pytest.fixture(scope='module')
+def aliases(area_store):
+    return area_store.aliases
+
+
+@pytest.mark.parametrize('text', ['Ст Оскол', 'С Посад', 'Д Шмидт', 'П Камчатский', 'ст Оскол'])
+def test_short_prefix_without_dot_is_kept(aliases, text):
+    assert aliases.strip_prefix(text) == text
+
+
+@pytest.mark.parametrize('text, stripped', [
+    ('ст. Вёшенская', 'Вёшенская'),
+    ('с.Кировское', 'Кировское'),
+    ('д. Малиновка', 'Малиновка'),
+    ('п. Никель', 'Никель'),
+    ('г Москва', 'Москва'),
+    ('г. Москва', 'Москва'),
+    ('пгт Яблоновский', 'Яблоновский'),
+    ('станица Вёшенская', 'Вёшенская'),
+])
+def test_prefix_is_stripped(aliases, text, stripped):
+    assert aliases.strip_prefix(text) == stripped
+
+
+def test_leading_short_word_does_not_redirect_exact_match(area_store):
+    # «Ст» здесь — часть названия, а не «станица»: в «Оскол» строка не превращается
+    assert match_exact('Ст Оскол', area_store, 85) is None
+    assert match_exact('ст. Вёшенская', area_store, 85) == (1439, 100.0, 0)
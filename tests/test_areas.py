@@ -0,0 +1,27 @@
+"""Подписи регионов справочника для выбора в редакторе"""
+from hh_city_matcher.areas import AreaStore
+
+
+def area(area_id, name, children=()):
+    return {'id': str(area_id), 'name': name, 'areas': list(children)}
+
+
+AREAS_TREE = [
+    area(113, 'Россия', [
+        area(1, 'Москва'),
+        area(1679, 'Нижегородская область', [area(1680, 'Арзамас'), area(1681, 'Бор')]),
+        area(1217, 'Тамбовская область', [area(1218, 'Арзамас'), area(1219, 'Арзамас')]),
+    ]),
+]
+
+
+def test_labels_are_unique():
+    area_store = AreaStore(AREAS_TREE)
+    assert area_store.label(1) == 'Москва'
+    assert area_store.label(1680) == 'Арзамас (Нижегородская область)'
+    # Одноимённые в одном регионе различаются по id: selectbox хранит выбор по подписи
+    assert area_store.label(1218) == 'Арзамас (Тамбовская область, id 1218)'
+    assert area_store.label(1219) == 'Арзамас (Тамбовская область, id 1219)'
+
+    labels = [area_store.label(area_id) for area_id in area_store.ids]
+    assert len(set(labels)) == len(labels)
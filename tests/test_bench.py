@@ -0,0 +1,38 @@
+"""Замер на замороженном справочнике из tests/fixtures"""
+import os
+
+from hh_city_matcher.bench import CASE_WEIGHTS, format_run, run_benchmark
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'areas.json.gz')
+
+
+def test_benchmark_on_frozen_fixture():
+    report = run_benchmark(FIXTURE_PATH, sizes=(300,), measure_memory=False)
+
+    assert report['fixture']['version'] == 'bench-fixture-1'
+    assert report['aliases']['digest']
+    [run] = report['runs']
+    assert run['size'] == 300
+    assert run['peak_mb'] is None
+    assert 0.0 <= run['accuracy'] <= 1.0
+
+    kinds = [kind for kind, _ in CASE_WEIGHTS] + ['duplicate']
+    assert list(run['by_kind']) == kinds
+    for counts in run['by_kind'].values():
+        assert set(counts) == {'rows', 'correct', 'wrong', 'missed'}
+        assert counts['correct'] + counts['wrong'] + counts['missed'] == counts['rows']
+    assert sum(counts['rows'] for counts in run['by_kind'].values()) == 300
+
+    # Полные названия из справочника находятся всегда
+    exact = run['by_kind']['exact']
+    assert exact['rows'] and exact['correct'] == exact['rows']
+
+    assert format_run(run)
+
+
+def test_benchmark_is_reproducible():
+    first, second = (
+        run_benchmark(FIXTURE_PATH, sizes=(200,), seed=7, measure_memory=False)['runs'][0]
+        for _ in range(2)
+    )
+    assert first['by_kind'] == second['by_kind']
@@ -0,0 +1,44 @@
+"""Кэш сопоставлений с записями нескольких версий справочника"""
+import sqlite3
+import time
+
+from hh_city_matcher.cache import MatchCache
+
+
+def test_versions_do_not_wipe_each_other(tmp_path):
+    cache = MatchCache(str(tmp_path / 'cache.sqlite3'))
+    cache.put_many({'москва': ((1, 100.0, 0), None)}, 85, 'v1')
+    cache.put_many({'москва': ((2, 90.0, 0), [(2, 90.0)])}, 85, 'v2')
+
+    assert cache.get_many(['москва'], 85, 'v1') == {'москва': ((1, 100.0, 0), None)}
+    assert cache.get_many(['москва'], 85, 'v2') == {'москва': ((2, 90.0, 0), [(2, 90.0)])}
+
+
+def test_least_recently_used_version_is_pruned(tmp_path):
+    cache = MatchCache(str(tmp_path / 'cache.sqlite3'), max_versions=2)
+    cache.put_many({'москва': ((1, 100.0, 0), None)}, 85, 'v1')
+    time.sleep(0.01)
+    cache.put_many({'москва': ((1, 100.0, 0), None)}, 85, 'v2')
+    time.sleep(0.01)
+    cache.get_many(['москва'], 85, 'v1')
+    cache.put_many({'москва': ((1, 100.0, 0), None)}, 85, 'v3')
+
+    assert cache.get_many(['москва'], 85, 'v1')
+    assert not cache.get_many(['москва'], 85, 'v2')
+    assert cache.get_many(['москва'], 85, 'v3')
+
+
+def test_single_version_cache_is_replaced(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            'CREATE TABLE matches (input TEXT NOT NULL, threshold INTEGER NOT NULL, area_id INTEGER,'
+            ' score REAL, candidates TEXT, used_at REAL NOT NULL, PRIMARY KEY (input, threshold))'
+        )
+        connection.execute("INSERT INTO matches VALUES ('москва', 85, 1, 100.0, NULL, 0)")
+    connection.close()
+
+    cache = MatchCache(path)
+    assert not cache.get_many(['москва'], 85, 'v1')
+    cache.put_many({'москва': ((1, 100.0, 0), None)}, 85, 'v1')
+    assert cache.get_many(['москва'], 85, 'v1')
@@ -0,0 +1,45 @@
+"""Хранилище ручных исправлений: версии, конфликты и подстановка при сопоставлении"""
+import pytest
+
+from hh_city_matcher.areas import AreaStore
+from hh_city_matcher.corrections import Conflict, CorrectionStore
+from hh_city_matcher.matching import smart_match_city
+
+AREAS_TREE = [
+    {'id': '113', 'name': 'Россия', 'areas': [
+        {'id': '1', 'name': 'Москва', 'areas': []},
+        {'id': '2', 'name': 'Санкт-Петербург', 'areas': []},
+    ]},
+]
+
+
+@pytest.fixture
+def area_store():
+    return AreaStore(AREAS_TREE)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CorrectionStore(str(tmp_path / 'corrections.sqlite3'))
+
+
+def test_newer_correction_is_a_conflict(store):
+    store.save({'Масква': 1}, source='a')
+    base_revision = store.revision
+    store.save({'масква': None}, base_revision=base_revision, source='b')
+
+    result = store.save({'Масква': 2}, base_revision=base_revision)
+    assert result.saved == 0
+    assert result.conflicts == [Conflict('Масква', None, 2)]
+
+    assert store.save({'Масква': 2}, base_revision=base_revision, force=True).saved == 1
+    assert [version for version, *_ in store.history('МАСКВА')] == [1, 2, 3]
+
+
+def test_loaded_corrections_match_without_the_store(store, area_store):
+    store.save({'Масква': 1, 'Нигде': None, 'Питер-2': 999})
+    corrections = store.load(area_store)
+    assert set(corrections) == {'масква', 'нигде'}
+
+    assert smart_match_city(' МАСКВА ', area_store, corrections=corrections)[0] == (1, 100.0, 0)
+    assert smart_match_city('нигде', area_store, corrections=corrections)[0] is None
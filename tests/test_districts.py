@@ -0,0 +1,63 @@
+"""Привязка федеральных округов к регионам справочника HH"""
+import pytest
+
+from hh_city_matcher.areas import AreaStore
+from hh_city_matcher.districts import DistrictMap
+from hh_city_matcher.regions import CityDirectory
+
+
+def area(area_id, name, children=()):
+    return {'id': str(area_id), 'name': name, 'areas': list(children)}
+
+
+# В справочнике регионы названы иначе, чем в перечне округов
+AREAS_TREE = [
+    area(113, 'Россия', [
+        area(1, 'Москва'),
+        area(1198, 'Кемеровская область - Кузбасс', [area(1199, 'Кемерово'), area(1200, 'Новокузнецк')]),
+        area(1890, 'Ханты-Мансийский АО - Югра', [area(1891, 'Сургут')]),
+        area(1911, 'Ненецкий АО', [area(1912, 'Нарьян-Мар')]),
+        area(1922, 'Ямало-Ненецкий АО', [area(1923, 'Салехард')]),
+    ]),
+]
+
+DISTRICTS = {
+    'Центральный федеральный округ': ['Москва'],
+    'Сибирский федеральный округ': ['Кемеровская область'],
+    'Уральский федеральный округ': [
+        'Ханты-Мансийский автономный округ — Югра', 'Ямало-Ненецкий автономный округ'
+    ],
+    'Северо-Западный федеральный округ': ['Ненецкий автономный округ', 'Вологодская область'],
+}
+
+
+@pytest.fixture(scope='module')
+def area_store():
+    return AreaStore(AREAS_TREE)
+
+
+@pytest.fixture(scope='module')
+def district_map(area_store):
+    return DistrictMap(area_store, DISTRICTS)
+
+
+def test_renamed_region_falls_back_to_substring(area_store, district_map):
+    assert district_map.ids_for_regions(['Кемеровская область']) == [1198]
+
+    cities = CityDirectory(area_store).cities_in_regions(district_map.ids_for_districts(['Сибирский федеральный округ']))
+    assert list(cities['Город']) == ['Кемерово', 'Новокузнецк']
+
+    assert 'Сопоставлено по вхождению: Кемеровская область → Кемеровская область - Кузбасс' in district_map.report()
+
+
+def test_exact_keys_take_precedence(district_map):
+    # «ненецкий ао» входит и в «ямало-ненецкий ао», но точная пара у каждого своя
+    assert district_map.ids_for_regions(['Ненецкий автономный округ']) == [1911]
+    assert district_map.ids_for_regions(['Ямало-Ненецкий автономный округ']) == [1922]
+    assert district_map.ids_for_regions(['Ханты-Мансийский автономный округ — Югра']) == [1890]
+
+
+def test_region_missing_from_tree_is_reported(district_map):
+    assert district_map.unmapped == [('Северо-Западный федеральный округ', 'Вологодская область')]
+    assert district_map.ids_for_regions(['Вологодская область']) == []
+    assert not district_map.is_complete
@@ -0,0 +1,147 @@
+"""Сопоставление: точный этап (порог и регион из строки) и индекс кандидатов"""
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from hh_city_matcher.areas import AreaStore
+from hh_city_matcher.engine import match_cities
+from hh_city_matcher.matching import (
+    CandidateIndex, get_candidates_batch, get_candidates_by_word, match_exact, smart_match_city
+)
+
+
+def area(area_id, name, children=()):
+    return {'id': str(area_id), 'name': name, 'areas': list(children)}
+
+
+AREAS_TREE = [
+    area(113, 'Россия', [
+        area(1, 'Москва'),
+        area(2019, 'Московская область', [area(2020, 'Балашиха'), area(2021, 'Королёв')]),
+        area(145, 'Ленинградская область', [area(146, 'Гатчина')]),
+        area(1146, 'Красноярский край', [area(1147, 'Железногорск (Красноярский край)')]),
+        area(1308, 'Курская область', [area(1309, 'Железногорск (Курская область)')]),
+    ]),
+]
+
+
+@pytest.fixture(scope='module')
+def area_store():
+    return AreaStore(AREAS_TREE)
+
+
+def match_one(client_city, area_store, threshold):
+    result_df, *_ = match_cities([client_city], area_store, threshold)
+    return result_df.iloc[0]
+
+
+def test_other_region_is_not_an_exact_match(area_store):
+    assert match_exact('Балашиха Ленинградская область', area_store, 85) is None
+
+    row = match_one('Балашиха Ленинградская область', area_store, 99)
+    assert row['Статус'] == '❌ Не найдено'
+    assert row['ID HH'] is None
+
+
+def test_exact_base_name_respects_threshold(area_store):
+    assert match_exact('Железногорск', area_store, 99) is None
+
+    row = match_one('Железногорск', area_store, 99)
+    assert row['Статус'] == '❌ Не найдено'
+
+
+def test_exact_base_name_above_threshold(area_store):
+    match_result = match_exact('Железногорск', area_store, 85)
+    assert match_result is not None
+    assert match_result[1] >= 85
+
+
+def test_region_selects_namesake(area_store):
+    assert match_exact('Железногорск Курская область', area_store, 85)[0] == 1309
+    assert match_exact('Железногорск Красноярский край', area_store, 85)[0] == 1147
+
+
+def test_yo_and_ye_are_the_same_letter(area_store):
+    # Полное название и базовое название с регионом ищутся с одинаковой заменой ё → е
+    assert match_exact('Королев', area_store, 100) == (2021, 100.0, 0)
+    assert match_exact('Королев Московская обл', area_store, 85)[0] == 2021
+    assert match_exact('королёв московская область', area_store, 85)[0] == 2021
+    assert match_exact('Королев Курская область', area_store, 85) is None
+
+
+def test_full_name_is_exact_at_any_threshold(area_store):
+    assert match_exact('балашиха', area_store, 100) == (2020, 100.0, 0)
+    match_result, _ = smart_match_city('Балашиха', area_store, 100)
+    assert match_result == (2020, 100.0, 0)
+
+
+# Синтетический справочник для сравнения индекса с полным перебором: много
+# одноимённых и почти одноимённых названий, чтобы оценки совпадали и порядок
+# при равенстве решал исход среза top-20
+_SYLLABLES = ('но', 'во', 'се', 'ло', 'ка', 'ми', 'ра', 'ту', 'ле', 'ни', 'ск', 'ар')
+_SUFFIXES = ('', 'ово', 'ка', 'ск', 'ий', ' посад', '-на-дону')
+
+
+def synthetic_tree(seed=0):
+    rng = random.Random(seed)
+    area_id = 10000
+    regions = []
+    for region_number in range(12):
+        cities = []
+        for _ in range(60):
+            area_id += 1
+            stem = ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randrange(1, 4)))
+            cities.append(area(area_id, (stem + rng.choice(_SUFFIXES)).capitalize()))
+        # Один и тот же город в каждом регионе: больше 20 равных оценок на запрос
+        area_id += 1
+        cities.append(area(area_id, 'Новоселово'))
+        regions.append(area(region_number + 1, f'Регион {region_number + 1}', cities))
+    return [area(113, 'Россия', regions)]
+
+
+def linear_candidates(client_city, area_store, limit=20):
+    """Кандидаты полным перебором названий, как до появления индекса"""
+    first_word = client_city.split()[0].lower().strip()
+    candidates = []
+    for area_id, name in zip(area_store.ids, area_store.names):
+        if first_word in name.lower():
+            candidates.append((area_id, fuzz.WRatio(client_city.lower(), name.lower())))
+    candidates.sort(key=lambda x: x[1], reverse=True)
+    return candidates[:limit]
+
+
+@pytest.fixture(scope='module')
+def synthetic_store():
+    return AreaStore(synthetic_tree())
+
+
+def synthetic_queries(area_store, seed=1):
+    rng = random.Random(seed)
+    names = [name for name in area_store.names if name]
+    queries = {'Новоселово', 'новоселово Регион 3', 'Но', 'н', 'ск', 'ово', 'Нет такого', 'ёжик'}
+    for name in rng.sample(names, 300):
+        queries.add(name)
+        queries.add(name[:rng.randrange(1, len(name) + 1)])
+        queries.add(f"{name.lower()} обл")
+        if len(name) > 3:
+            position = rng.randrange(1, len(name) - 1)
+            queries.add(name[:position] + name[position + 1:])
+    return sorted(queries)
+
+
+def test_indexed_candidates_match_linear_scan(synthetic_store):
+    candidate_index = CandidateIndex(synthetic_store)
+    for query in synthetic_queries(synthetic_store):
+        assert get_candidates_by_word(query, candidate_index) == linear_candidates(query, synthetic_store), query
+
+
+def test_batch_candidates_match_linear_scan(synthetic_store):
+    candidate_index = CandidateIndex(synthetic_store)
+    queries = synthetic_queries(synthetic_store)
+    batch = get_candidates_batch(queries, candidate_index)
+    # Подходящих названий больше лимита: при равных оценках срез определяется порядком справочника
+    assert len(batch['Но']) == 20
+    for query in queries:
+        assert batch[query] == linear_candidates(query, synthetic_store), query
+        assert batch[query] == get_candidates_by_word(query, candidate_index), query
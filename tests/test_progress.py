@@ -0,0 +1,57 @@
+"""Итоговое состояние прогресса при неточной оценке числа строк"""
+import io
+
+from hh_city_matcher.progress import ConsoleProgress, ProgressReporter
+
+
+class RecordingProgress(ProgressReporter):
+    def __init__(self, total=None, **kwargs):
+        super().__init__(total, **kwargs)
+        self.rendered = []
+        self.closed = None
+
+    def render(self, state):
+        self.rendered.append(state)
+
+    def close(self, state):
+        self.closed = state
+
+
+def test_finish_renders_full_bar_when_estimate_is_too_high():
+    # Обновления реже раза в час: после первого всё, кроме итога, отбрасывается
+    progress = RecordingProgress(total=1000, min_interval=3600, min_step=1.0)
+    for done in range(1, 951):
+        progress(done)
+    assert progress.rendered[-1].done == 1
+
+    progress.finish()
+    final = progress.rendered[-1]
+    assert (final.done, final.total, final.fraction) == (950, 950, 1.0)
+    assert progress.closed is final
+
+
+def test_interrupted_run_keeps_estimate():
+    progress = RecordingProgress(total=1000, min_interval=3600, min_step=1.0)
+    for done in range(1, 401):
+        progress(done)
+
+    progress.finish(complete=False)
+    final = progress.rendered[-1]
+    assert (final.done, final.total, final.fraction) == (400, 1000, 0.4)
+
+
+def test_finish_without_updates_only_closes():
+    progress = RecordingProgress(total=1000)
+    progress.finish()
+    assert progress.rendered == []
+    assert progress.closed is None
+
+
+def test_console_ends_at_100_percent():
+    stream = io.StringIO()
+    progress = ConsoleProgress(total=1000, stream=stream, min_interval=3600, min_step=1.0)
+    for done in range(1, 951):
+        progress(done)
+    progress.finish()
+    last_line = stream.getvalue().rstrip('\n').split('\r')[-1]
+    assert last_line.startswith('100.0% Обработано 950 из 950 городов')
@@ -0,0 +1,115 @@
+"""Перепроверка снимка справочника против локального HTTP-сервера"""
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from hh_city_matcher.snapshot import AreasProvider, AreasSnapshot, load_snapshot, save_snapshot
+
+AREAS_V1 = [{'id': '113', 'name': 'Россия', 'parent_id': None, 'areas': []}]
+AREAS_V2 = [{'id': '113', 'name': 'Россия', 'parent_id': None, 'areas': [
+    {'id': '1', 'name': 'Москва', 'parent_id': '113', 'areas': []}
+]}]
+
+
+class StubAreasServer:
+    """Отдаёт body с etag и отвечает 304 на совпавший If-None-Match"""
+
+    def __init__(self):
+        self.body = AREAS_V1
+        self.etag = '"v1"'
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(dict(self.headers))
+                if self.headers.get('If-None-Match') == stub.etag:
+                    self.send_response(304)
+                    self.send_header('ETag', stub.etag)
+                    self.end_headers()
+                    return
+                payload = json.dumps(stub.body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.send_header('ETag', stub.etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/areas'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def closed_port_url():
+    """Адрес, на котором никто не слушает"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}/areas'
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / 'hh_areas.json.gz')
+
+
+def test_not_modified_keeps_snapshot(snapshot_path):
+    with StubAreasServer() as server:
+        provider = AreasProvider(snapshot_path, server.url, revalidate_interval=0, timeout=5)
+        first = provider.refresh()
+        assert first.areas == AREAS_V1
+        assert first.etag == '"v1"'
+
+        second = provider.refresh()
+        assert second is first
+        assert server.requests[-1].get('If-None-Match') == '"v1"'
+        assert provider.last_error is None
+
+
+def test_changed_body_replaces_snapshot(snapshot_path):
+    with StubAreasServer() as server:
+        provider = AreasProvider(snapshot_path, server.url, revalidate_interval=0, timeout=5)
+        first = provider.refresh()
+
+        server.body, server.etag = AREAS_V2, '"v2"'
+        fresh = provider.refresh()
+        assert fresh.areas == AREAS_V2
+        assert fresh.version != first.version
+        assert fresh.etag == '"v2"'
+
+    saved = load_snapshot(snapshot_path)
+    assert saved.version == fresh.version
+    assert saved.areas == AREAS_V2
+
+
+def test_api_down_serves_snapshot(snapshot_path):
+    save_snapshot(AreasSnapshot(AREAS_V1, 'v1', etag='"v1"'), snapshot_path)
+    provider = AreasProvider(snapshot_path, closed_port_url(), revalidate_interval=0, timeout=2)
+
+    snapshot = provider.get(background=False)
+    assert snapshot.version == 'v1'
+    assert snapshot.areas == AREAS_V1
+    assert isinstance(provider.last_error, requests.RequestException)
+
+
+def test_api_down_without_snapshot_raises(snapshot_path):
+    provider = AreasProvider(snapshot_path, closed_port_url(), timeout=2)
+
+    with pytest.raises(requests.RequestException):
+        provider.get(background=False)